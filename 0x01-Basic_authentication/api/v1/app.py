@@ -11,7 +11,7 @@ from typing import Tuple
 from flask import Flask, abort, jsonify, request
 from flask_cors import CORS, cross_origin
 
-from api.v1.auth.auth import Auth
+from api.v1.auth.auth import Auth, ExcludedPaths
 from api.v1.auth.basic_auth import BasicAuth
 from api.v1.views import app_views
 
@@ -31,6 +31,11 @@ if auth_type == "basic_auth":
 else:
     auth = Auth()
 
+# Paths served without authentication, compiled once for require_auth
+EXCLUDED_PATHS = ExcludedPaths(['/api/v1/status/',
+                                '/api/v1/unauthorized/',
+                                '/api/v1/forbidden/'])
+
 
 @app.errorhandler(404)
 def not_found(error) -> str:
@@ -75,13 +80,9 @@ def handle_request():
     # If auth is None, do nothing
     if auth is None:
         return
-    # Create list of excluded paths
-    excluded_paths = ['/api/v1/status/',
-                      '/api/v1/unauthorized/',
-                      '/api/v1/forbidden/']
     # if request.path is not part of list above, do nothing
     # You must use the method require_auth from the auth instance
-    if not auth.require_auth(request.path, excluded_paths):
+    if not auth.require_auth(request.path, EXCLUDED_PATHS):
         return
     # If auth.authorization_header(request) returns None, raise error
     # 401 - you must use abort
@@ -11,11 +11,12 @@ from typing import Tuple
 from flask import Flask, abort, jsonify, request
 from flask_cors import CORS, cross_origin
 
-from api.v1.auth.auth import Auth
+from api.v1.auth.auth import Auth, ExcludedPaths
 from api.v1.auth.basic_auth import BasicAuth
 from api.v1.auth.session_auth import SessionAuth
 from api.v1.auth.session_db_auth import SessionDBAuth
 from api.v1.auth.session_exp_auth import SessionExpAuth
+from api.v1.auth.signed_session_auth import SignedSessionAuth
 from api.v1.views import app_views
 
 app = Flask(__name__)
@@ -34,11 +35,19 @@ elif auth_type == 'session_exp_auth':
     auth = SessionExpAuth()
 elif auth_type == 'session_db_auth':
     auth = SessionDBAuth()
+elif auth_type == 'signed_session_auth':
+    auth = SignedSessionAuth()
 elif auth_type == "basic_auth":
     auth = BasicAuth()
 else:
     auth = Auth()
 
+# Paths served without authentication, compiled once for require_auth
+EXCLUDED_PATHS = ExcludedPaths(['/api/v1/status/',
+                                '/api/v1/unauthorized/',
+                                '/api/v1/forbidden/',
+                                '/api/v1/auth_session/login/'])
+
 
 @app.errorhandler(404)
 def not_found(error) -> str:
@@ -83,14 +92,9 @@ def handle_request():
     # If auth is None, do nothing
     if auth is None:
         return
-    # Create list of excluded paths
-    excluded_paths = ['/api/v1/status/',
-                      '/api/v1/unauthorized/',
-                      '/api/v1/forbidden/',
-                      '/api/v1/auth_session/login/']
     # if request.path is not part of the list above, do nothing
     # You must use the method require_auth from the auth instance
-    if not auth.require_auth(request.path, excluded_paths):
+    if not auth.require_auth(request.path, EXCLUDED_PATHS):
         return
     # If auth.authorization_header(request) and auth.session_cookie(request)
     auth_header = auth.authorization_header(request)
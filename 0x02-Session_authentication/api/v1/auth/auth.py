@@ -3,16 +3,74 @@
 Module for authentication
 """
 import os
-from typing import List, TypeVar
+from typing import List, TypeVar, Union
 
 from flask import request
 
 
+class ExcludedPaths():
+    """Excluded paths of `Auth.require_auth`, compiled once.
+
+    Paths ending by a * exclude every path starting with the rest of
+    them, they are kept in a character trie. The other paths are kept,
+    without their trailing slashes, in a set. Matching a path costs
+    O(len(path)) whatever the number of excluded paths.
+    """
+
+    # Key marking the end of a wildcard prefix in a trie node
+    END = ''
+
+    def __init__(self, excluded_paths: List[str] = None):
+        """Compiles a list of excluded paths.
+
+        Args:
+            excluded_paths (List[str], optional): The excluded paths.
+        """
+        self.exact = set()
+        self.trie = {}
+        for excluded_path in excluded_paths or []:
+            if excluded_path.endswith("*"):
+                node = self.trie
+                for char in excluded_path[:-1]:
+                    node = node.setdefault(char, {})
+                node[self.END] = True
+            else:
+                self.exact.add(excluded_path.rstrip("/"))
+
+    def __bool__(self) -> bool:
+        """Tells if there is at least one excluded path.
+        """
+        return len(self.exact) > 0 or len(self.trie) > 0
+
+    def matches(self, path: str) -> bool:
+        """Checks if a path, without its trailing slashes, is excluded.
+
+        Args:
+            path (str): The path to check.
+
+        Returns:
+            bool: True if the path is excluded, False otherwise.
+        """
+        if path in self.exact:
+            return True
+        node = self.trie
+        # Walk the trie along the path until a wildcard prefix ends
+        for char in path:
+            if self.END in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return self.END in node
+
+
 class Auth():
     """Template for all authentication system implemented this app.
     """
 
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], ExcludedPaths]
+                     ) -> bool:
         """This function takes a path and a list of excluded paths as arguments
         and returns a boolean value.
 
@@ -26,7 +84,9 @@ class Auth():
 
         Args:
             path (str): The path to check against the list of excluded paths.
-            excluded_paths (List[str]): The list of excluded paths.
+            excluded_paths (List[str] | ExcludedPaths): The list of
+            excluded paths, or the same paths compiled once in an
+            `ExcludedPaths`.
 
         Returns:
             bool: True if  path is not in the excluded paths list,
@@ -38,23 +98,15 @@ class Auth():
         # If excluded_paths is None or empty, return True
         if not excluded_paths:
             return True
+        # Compile a list of excluded paths, callers checking many paths
+        # should compile it once
+        if not isinstance(excluded_paths, ExcludedPaths):
+            excluded_paths = ExcludedPaths(excluded_paths)
         # Remove the trailing slash from the path
         path = path.rstrip("/")
-        # Check if path is in excluded_paths and return False if path is
-        # in excluded_paths
-        # Loop through excluded paths
-        for excluded_path in excluded_paths:
-            # Check if given path starts with excluded path, with * at the end
-            if excluded_path.endswith("*") and \
-                    path.startswith(excluded_path[:-1]):
-                # Return False if path starts with excluded path with * at end
-                return False
-            # Check if the given path is equal to the excluded path
-            elif path == excluded_path.rstrip("/"):
-                # Return False if the path is equal to the excluded path
-                return False
-        # If path is not in excluded_paths, return True
-        return True
+        # Return False if path is an excluded path or starts with an
+        # excluded path with * at the end
+        return not excluded_paths.matches(path)
 
     def authorization_header(self, request=None) -> str:
         """Gets the value of Authorization header from the request
@@ -79,6 +131,18 @@ class Auth():
         """
         return None
 
+    def destroy_all_sessions(self, user_id: str) -> int:
+        """Deletes every session of a user. Authentication systems
+        without sessions have none to delete.
+
+        Args:
+            user_id (str): ID of the user to log out everywhere.
+
+        Returns:
+            int: The number of sessions deleted.
+        """
+        return 0
+
     def session_cookie(self, request=None) -> str:
         """Retrieves session cookie from a request.
 
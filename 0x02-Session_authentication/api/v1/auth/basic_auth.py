@@ -3,6 +3,12 @@
 """
 import base64
 import binascii
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
 from typing import Tuple, TypeVar
 
 from models.user import User
@@ -13,10 +19,105 @@ from .auth import Auth
 class BasicAuth(Auth):
     """Authentication class.
 
+    Verified Authorization headers are cached, keyed by their HMAC under
+    a per-process secret, so repeated requests skip the decoding, the
+    user lookup and the password hashing. The cache holds up to
+    BASIC_AUTH_CACHE_SIZE headers for BASIC_AUTH_CACHE_TTL seconds, and
+    drops the entries of a user whose password changes or who is removed.
+
     Args:
         Auth (type): Class inherited from.
     """
 
+    def __init__(self):
+        """Initializes the verified credentials cache.
+        """
+        super().__init__()
+        self.cache_size = int(os.getenv('BASIC_AUTH_CACHE_SIZE', 1024))
+        self.cache_ttl = int(os.getenv('BASIC_AUTH_CACHE_TTL', 300))
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache_secret = os.urandom(32)
+        # HMAC of header -> (user ID, password hash, expiration time)
+        self._cache = OrderedDict()
+        # user ID -> its cached header keys (dict used as a set)
+        self._cache_by_user = {}
+        self._cache_lock = threading.Lock()
+        User.add_listener(self._on_user_change)
+
+    def _cache_key(self, authorization_header: str) -> bytes:
+        """Keyed hash of an Authorization header, so cleartext
+        credentials are never kept in memory.
+        """
+        return hmac.new(self._cache_secret,
+                        authorization_header.encode('utf-8'),
+                        hashlib.sha256).digest()
+
+    def _cache_get(self, key: bytes) -> TypeVar('User'):
+        """Returns the User cached for a header key, None on a miss.
+        """
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            user_id, password, expires_at = entry
+            if expires_at < time.monotonic():
+                self._cache_drop(key)
+                return None
+            self._cache.move_to_end(key)
+        user = User.get(user_id)
+        # The password could have been changed by another process
+        if user is None or user.password != password:
+            with self._cache_lock:
+                self._cache_drop(key)
+            return None
+        return user
+
+    def _cache_put(self, key: bytes, user: TypeVar('User')):
+        """Caches the User verified for a header key, evicting the least
+        recently used entry when the cache is full.
+        """
+        if self.cache_size <= 0:
+            return
+        expires_at = time.monotonic() + self.cache_ttl
+        with self._cache_lock:
+            self._cache_drop(key)
+            self._cache[key] = (user.id, user.password, expires_at)
+            self._cache_by_user.setdefault(user.id, {})[key] = None
+            while len(self._cache) > self.cache_size:
+                self._cache_drop(next(iter(self._cache)))
+
+    def _cache_drop(self, key: bytes):
+        """Removes a header key from the cache, the cache lock being held.
+        """
+        entry = self._cache.pop(key, None)
+        if entry is None:
+            return
+        keys = self._cache_by_user.get(entry[0])
+        if keys is not None:
+            keys.pop(key, None)
+            if len(keys) == 0:
+                del self._cache_by_user[entry[0]]
+
+    def _on_user_change(self, event: str, user: TypeVar('User')):
+        """Drops the cached headers of a removed user, or of a user whose
+        password changed, found through the cached keys of the user.
+        """
+        with self._cache_lock:
+            for key in list(self._cache_by_user.get(user.id, ())):
+                if event == 'remove' or \
+                        self._cache[key][1] != user.password:
+                    self._cache_drop(key)
+
+    def cache_stats(self) -> dict:
+        """Returns the hit and miss counters and the size of the cache.
+        """
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'size': len(self._cache),
+        }
+
     def extract_base64_authorization_header(
             self, authorization_header: str) -> str:
         """Extracts the Base64 part of Authorization header.
@@ -113,8 +214,20 @@ class BasicAuth(Auth):
         """
         # Get the authorization header from the request
         auth_header = self.authorization_header(request)
+        # Return the cached User if this header was already verified
+        key = None
+        if isinstance(auth_header, str):
+            key = self._cache_key(auth_header)
+            user = self._cache_get(key)
+            if user is not None:
+                self.cache_hits += 1
+                return user
+        self.cache_misses += 1
         b64_auth_header = self.extract_base64_authorization_header(auth_header)
         dec_header = self.decode_base64_authorization_header(b64_auth_header)
         user_email, user_pwd = self.extract_user_credentials(dec_header)
         # Return the User instance based on the user email and password
-        return self.user_object_from_credentials(user_email, user_pwd)
+        user = self.user_object_from_credentials(user_email, user_pwd)
+        if user is not None and key is not None:
+            self._cache_put(key, user)
+        return user
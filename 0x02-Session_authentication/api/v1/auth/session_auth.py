@@ -3,6 +3,7 @@
 """
 
 
+import threading
 from uuid import uuid4
 
 from models.user import User
@@ -17,6 +18,9 @@ class SessionAuth(Auth):
         Auth (type): Class inherited from.
     """
     user_id_by_session_id = {}
+    # Reverse index of user_id_by_session_id: user ID -> its session IDs
+    session_ids_by_user_id = {}
+    _sessions_lock = threading.Lock()
 
     def create_session(self, user_id: str = None) -> str:
         """Creates a Session ID for user_id.
@@ -33,7 +37,11 @@ class SessionAuth(Auth):
             # Generate a session ID using the uuid module's uuid4() function
             session_id = str(uuid4())
             # Store the mapping of session ID to user ID in the dictionary,
-            self.user_id_by_session_id[session_id] = user_id
+            # and the reverse one
+            with self._sessions_lock:
+                self.user_id_by_session_id[session_id] = user_id
+                self.session_ids_by_user_id.setdefault(
+                    user_id, set()).add(session_id)
             # Return the session ID
             return session_id
 
@@ -100,8 +108,47 @@ class SessionAuth(Auth):
         if (request is None or session_id is None) or user_id is None:
             return False
         # Otherwise, delete in self.user_id_by_session_id the Session ID (as
-        # key of this dictionary) and return True
-        if session_id in self.user_id_by_session_id:
-            del self.user_id_by_session_id[session_id]
+        # key of this dictionary) and return True. Two concurrent logouts
+        # of one session can't raise a KeyError
+        self._forget_session(session_id)
         # Return True if the session was destroyed successfully
         return True
+
+    def _forget_session(self, session_id: str) -> bool:
+        """Deletes a session from user_id_by_session_id and its reverse
+        index.
+
+        Args:
+            session_id (str): The session ID to delete.
+
+        Returns:
+            bool: True if the session existed, False otherwise.
+        """
+        with self._sessions_lock:
+            value = self.user_id_by_session_id.pop(session_id, None)
+            if value is None:
+                return False
+            # Subclasses store a dictionary holding the user ID
+            user_id = value.get('user_id') if isinstance(value, dict) \
+                else value
+            session_ids = self.session_ids_by_user_id.get(user_id)
+            if session_ids is not None:
+                session_ids.discard(session_id)
+                if len(session_ids) == 0:
+                    del self.session_ids_by_user_id[user_id]
+            return True
+
+    def destroy_all_sessions(self, user_id: str) -> int:
+        """Deletes every session of a user.
+
+        Args:
+            user_id (str): ID of the user to log out everywhere.
+
+        Returns:
+            int: The number of sessions deleted.
+        """
+        with self._sessions_lock:
+            session_ids = self.session_ids_by_user_id.pop(user_id, set())
+            for session_id in session_ids:
+                self.user_id_by_session_id.pop(session_id, None)
+        return len(session_ids)
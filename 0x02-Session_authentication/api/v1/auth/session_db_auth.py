@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 """Module for session database authentication
 """
+import os
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import Tuple, TypeVar
+from uuid import uuid4
 
+from models.user import User
 from models.user_session import UserSession
 
 from .session_exp_auth import SessionExpAuth
@@ -10,7 +16,114 @@ from .session_exp_auth import SessionExpAuth
 
 class SessionDBAuth(SessionExpAuth):
     """Session authentication class with database storage & expiration support.
+
+    The last use of a sliding session is its `updated_at`. Touched
+    sessions are saved together by a background thread every
+    SESSION_TOUCH_INTERVAL seconds, instead of on the request.
+
+    The ID of a UserSession is its session id, so sessions are found by
+    ID in O(1). Sessions stored before that are found through the
+    session_id index.
+
+    Resolved sessions are cached with their User, so most authenticated
+    requests take one dict lookup. The cache holds up to
+    SESSION_CACHE_SIZE sessions, each for at most SESSION_CACHE_TTL
+    seconds and never past its expiration or next touch. Destroyed
+    sessions and the sessions of removed users are dropped at once,
+    found through the cached session ids of each user. Like
+    user_id_by_session_id, the cache is shared by every instance of the
+    process, so a logout through one instance is seen by the others.
     """
+    # session id -> (user id, valid until, User)
+    _cache = OrderedDict()
+    # user id -> its cached session ids (dict used as a set)
+    _cache_by_user = {}
+    _cache_lock = threading.Lock()
+    _listening = False
+
+    def __init__(self):
+        """Initializes the queue of touched sessions.
+        """
+        super().__init__()
+        self.touch_interval = float(
+            os.environ.get("SESSION_TOUCH_INTERVAL", 5))
+        # Touched UserSession instances by session id, saved by _toucher
+        self._touched = {}
+        self._touched_lock = threading.Lock()
+        self._toucher = None
+        self.cache_size = int(os.environ.get("SESSION_CACHE_SIZE", 10000))
+        self.cache_ttl = int(os.environ.get("SESSION_CACHE_TTL", 60))
+        self.cache_hits = 0
+        self.cache_misses = 0
+        with self._cache_lock:
+            # The cache is shared, its listener is registered once
+            if not type(self)._listening:
+                type(self)._listening = True
+                User.add_listener(type(self)._on_user_change)
+
+    def _cache_get(self, session_id: str) -> TypeVar('User'):
+        """Returns the User cached for a session id, None on a miss.
+        """
+        with self._cache_lock:
+            entry = self._cache.get(session_id)
+            if entry is None:
+                return None
+            if entry[1] < datetime.utcnow():
+                self._cache_drop(session_id)
+                return None
+            self._cache.move_to_end(session_id)
+            return entry[2]
+
+    def _cache_put(self, session_id: str, user: TypeVar('User'),
+                   valid_until: datetime):
+        """Caches the User of a session until `valid_until`, evicting the
+        least recently used entry when the cache is full.
+        """
+        if self.cache_size <= 0:
+            return
+        valid_until = min(valid_until, datetime.utcnow() +
+                          timedelta(seconds=self.cache_ttl))
+        with self._cache_lock:
+            self._cache_drop(session_id)
+            self._cache[session_id] = (user.id, valid_until, user)
+            self._cache_by_user.setdefault(user.id, {})[session_id] = None
+            while len(self._cache) > self.cache_size:
+                self._cache_drop(next(iter(self._cache)))
+
+    @classmethod
+    def _cache_drop(cls, session_id: str):
+        """Removes a session from the cache, the cache lock being held.
+        """
+        entry = cls._cache.pop(session_id, None)
+        if entry is None:
+            return
+        session_ids = cls._cache_by_user.get(entry[0])
+        if session_ids is not None:
+            session_ids.pop(session_id, None)
+            if len(session_ids) == 0:
+                del cls._cache_by_user[entry[0]]
+
+    @classmethod
+    def _on_user_change(cls, event: str, user: TypeVar('User')):
+        """Drops the cached sessions of a removed user, and points the
+        ones of a saved user to its new state.
+        """
+        with cls._cache_lock:
+            for session_id in list(cls._cache_by_user.get(user.id, ())):
+                if event == 'remove':
+                    cls._cache_drop(session_id)
+                else:
+                    entry = cls._cache[session_id]
+                    cls._cache[session_id] = (entry[0], entry[1], user)
+
+    def cache_stats(self) -> dict:
+        """Returns the hit and miss counters and the size of the cache.
+        """
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'size': len(self._cache),
+        }
 
     def create_session(self, user_id: str) -> str:
         """Creates and stores session id for the user.
@@ -21,12 +134,12 @@ class SessionDBAuth(SessionExpAuth):
         Returns:
             str: Session id.
         """
-        # Call the parent method to create a session id
-        session_id = super().create_session(user_id)
-
-        # Check if a session id is returned
-        if isinstance(session_id, str):
+        # Sessions are only kept in the database, not in the
+        # user_id_by_session_id dictionary of the parent classes
+        if type(user_id) is str:
+            session_id = str(uuid4())
             kwargs = {
+                'id': session_id,
                 'user_id': user_id,
                 'session_id': session_id,
             }
@@ -34,6 +147,28 @@ class SessionDBAuth(SessionExpAuth):
             user_session.save()
             return session_id
 
+    @staticmethod
+    def get_session(session_id: str) -> UserSession:
+        """Retrieves the UserSession instance of a session id.
+
+        Args:
+            session_id (str): Session id.
+
+        Returns:
+            UserSession: The session, None if it is not found.
+        """
+        if type(session_id) is not str:
+            return None
+        user_session = UserSession.get(session_id)
+        if user_session is not None and \
+                user_session.session_id == session_id:
+            return user_session
+        # Sessions created with a random ID
+        sessions = UserSession.search({'session_id': session_id})
+        if len(sessions) <= 0:
+            return None
+        return sessions[0]
+
     def user_id_for_session_id(self, session_id: str) -> str:
         """Retrieves the user id of user associated with given session id.
 
@@ -43,24 +178,136 @@ class SessionDBAuth(SessionExpAuth):
         Returns:
             str: User id associated with the session id.
         """
+        session = self._lookup(session_id)
+        return session[0] if session is not None else None
+
+    def current_user(self, request=None) -> TypeVar('User'):
+        """Returns the User of the session cookie of a request, from the
+        cache when possible.
+
+        Args:
+            request (flask.request, optional): The request object containing
+            the session cookie. Defaults to None.
+
+        Returns:
+            User: The User of the session, None if there is none.
+        """
+        session_id = self.session_cookie(request)
+        if session_id is None:
+            return None
+        user = self._cache_get(session_id)
+        if user is not None:
+            self.cache_hits += 1
+            return user
+        self.cache_misses += 1
+        session = self._lookup(session_id)
+        if session is None:
+            return None
+        user_id, valid_until = session
+        user = User.get(user_id)
+        if user is not None:
+            self._cache_put(session_id, user, valid_until)
+        return user
+
+    def _lookup(self, session_id: str) -> Tuple[str, datetime]:
+        """Finds a valid session in the database, touching it if needed.
+
+        Args:
+            session_id (str): Session id.
+
+        Returns:
+            Tuple[str, datetime]: The user id of the session, and the time
+            until which it is valid without another lookup. None if the
+            session is not found or expired.
+        """
         try:
             # Try to retrieve the UserSession instance from the database
-            sessions = UserSession.search({'session_id': session_id})
+            user_session = self.get_session(session_id)
         except Exception:
             # Return None in case of an error
             return None
-        if len(sessions) <= 0:
+        if user_session is None:
             # Return None if the session id is not found
             return None
-        # Check the expiration time of the session
-        cur_time = datetime.now()
-        time_span = timedelta(seconds=self.session_duration)
-        exp_time = sessions[0].created_at + time_span
-        if exp_time < cur_time:
+        # Check the expiration time of the session, the timestamps of
+        # models are in UTC
+        cur_time = datetime.utcnow()
+        exp_time = self.session_expiration(user_session.created_at,
+                                           user_session.updated_at)
+        if exp_time is not None and exp_time < cur_time:
             # Return None if the session has already expired
             return None
+        # Record the use of the session when its last one is old enough
+        last_seen = user_session.updated_at
+        if self.needs_touch(last_seen, cur_time):
+            self.touch(user_session)
+            last_seen = cur_time
+        valid_until = exp_time or datetime.max
+        if self.session_sliding and self.session_duration > 0:
+            # Come back to touch the session once the threshold is passed
+            valid_until = min(valid_until, last_seen +
+                              timedelta(seconds=self.touch_threshold))
         # Return the user id associated with the session
-        return sessions[0].user_id
+        return user_session.user_id, valid_until
+
+    def touch(self, user_session: UserSession):
+        """Queues a session to save its last use.
+
+        Args:
+            user_session (UserSession): The session used.
+        """
+        with self._touched_lock:
+            self._touched[user_session.session_id] = user_session
+            if self._toucher is None:
+                self._toucher = threading.Thread(target=self._touch_loop,
+                                                 name="session-toucher",
+                                                 daemon=True)
+                self._toucher.start()
+
+    def flush_touches(self) -> int:
+        """Saves the queued sessions in one batch.
+
+        Returns:
+            int: The number of sessions saved.
+        """
+        with self._touched_lock:
+            touched, self._touched = self._touched, {}
+        saved = 0
+        with UserSession.batch():
+            for user_session in touched.values():
+                # Don't bring back sessions destroyed since their use
+                if UserSession.get(user_session.id) is None:
+                    continue
+                # save() sets updated_at to now
+                user_session.save()
+                saved += 1
+        return saved
+
+    def destroy_all_sessions(self, user_id: str) -> int:
+        """Deletes every session of a user, found through the user_id
+        index of UserSession, in one batch.
+
+        Args:
+            user_id (str): ID of the user to log out everywhere.
+
+        Returns:
+            int: The number of sessions deleted.
+        """
+        sessions = UserSession.search({'user_id': user_id})
+        with UserSession.batch():
+            for user_session in sessions:
+                user_session.remove()
+        with self._cache_lock:
+            for session_id in list(self._cache_by_user.get(user_id, ())):
+                self._cache_drop(session_id)
+        return len(sessions)
+
+    def _touch_loop(self):
+        """Body of the toucher thread: saves the queued sessions every
+        touch_interval seconds.
+        """
+        while not self._stop_sweeper.wait(self.touch_interval):
+            self.flush_touches()
 
     def destroy_session(self, request=None) -> bool:
         """Destroys an authenticated session.
@@ -75,13 +322,15 @@ class SessionDBAuth(SessionExpAuth):
         session_id = self.session_cookie(request)
         try:
             # Try to retrieve the UserSession instance from the database
-            sessions = UserSession.search({'session_id': session_id})
+            user_session = self.get_session(session_id)
         except Exception:
             # Return False in case of an error
             return False
-        if len(sessions) <= 0:
+        with self._cache_lock:
+            self._cache_drop(session_id)
+        if user_session is None:
             # Return False if the session id is not found
             return False
         # Remove the UserSession instance from the database
-        sessions[0].remove()
+        user_session.remove()
         return True
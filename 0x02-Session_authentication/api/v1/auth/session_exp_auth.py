@@ -3,7 +3,9 @@
 """
 
 
+import heapq
 import os
+import threading
 from datetime import datetime as dt, timedelta
 
 from .session_auth import SessionAuth
@@ -14,6 +16,17 @@ class SessionExpAuth(SessionAuth):
     SessionExpAuth is a class that extends functionality of the
     SessionAuth class.
     It adds session expiration to the authentication mechanism.
+
+    Sessions are pushed on a min-heap keyed by their expiration time. A
+    daemon thread pops the expired ones every SESSION_SWEEP_INTERVAL
+    seconds, at most SESSION_SWEEP_BATCH at a time, and deletes them from
+    user_id_by_session_id so its size follows the active sessions.
+
+    With SESSION_SLIDING set, SESSION_DURATION counts from the last use of
+    the session instead of its creation. The last use is only updated
+    when it is SESSION_TOUCH_THRESHOLD seconds old, so most requests don't
+    write anything. SESSION_MAX_LIFETIME bounds the life of a session
+    whatever its use.
     """
 
     def __init__(self):
@@ -29,6 +42,34 @@ class SessionExpAuth(SessionAuth):
         # If  environment variable does not exist or cannot be converted to
         # an integer, set session_duration to 0
         self.session_duration = int(os.environ.get("SESSION_DURATION", 0))
+        # Extend sessions on activity, recording their last use when it is
+        # older than touch_threshold seconds
+        self.session_sliding = os.environ.get(
+            "SESSION_SLIDING", "0").lower() in ("1", "true", "yes")
+        self.touch_threshold = int(
+            os.environ.get("SESSION_TOUCH_THRESHOLD", 60))
+        # Absolute lifetime of a session from its creation, 0 for none
+        self.session_max_lifetime = int(
+            os.environ.get("SESSION_MAX_LIFETIME", 0))
+        # Seconds between two sweeps of the expired sessions, 0 to only
+        # sweep when sweep_expired() is called
+        self.sweep_interval = float(
+            os.environ.get("SESSION_SWEEP_INTERVAL", 60))
+        # Most sessions evicted while holding the lock
+        self.sweep_batch = int(os.environ.get("SESSION_SWEEP_BATCH", 1000))
+        # (expiration time, session ID) of the sessions which expire
+        self._expirations = []
+        self._expirations_lock = threading.Lock()
+        self.expired_count = 0
+        self._swept = 0
+        self._sweeper = None
+        self._stop_sweeper = threading.Event()
+        expiring = self.session_duration > 0 or self.session_max_lifetime > 0
+        if expiring and self.sweep_interval > 0:
+            self._sweeper = threading.Thread(target=self._sweep_loop,
+                                             name="session-sweeper",
+                                             daemon=True)
+            self._sweeper.start()
 
     def create_session(self, user_id: int) -> str:
         """Creates a new session for a user and assigns a session ID.
@@ -54,10 +95,16 @@ class SessionExpAuth(SessionAuth):
             return None
         # Add the created_at key to the session dictionary
         # The value of this key is the current time
+        created_at = dt.now()
         self.user_id_by_session_id[sessn_id] = {
             'user_id': user_id,
-            'created_at': dt.now()
+            'created_at': created_at
         }
+        # Schedule the eviction of the session once it expired
+        expires_at = self.session_expiration(created_at, created_at)
+        if expires_at is not None:
+            with self._expirations_lock:
+                heapq.heappush(self._expirations, (expires_at, sessn_id))
         # Return session ID
         return sessn_id
 
@@ -85,23 +132,139 @@ class SessionExpAuth(SessionAuth):
         session_dict = self.user_id_by_session_id.get(session_id)
         if session_dict is None:
             return None
-        # If the session_duration is 0 or less, return the user_id
-        if self.session_duration <= 0:
-            return session_dict.get("user_id")
         # Get created_at from session info
         created_at = session_dict.get('created_at')
-        # If the created_at key does not exist in the session dictionary,
+        last_seen = session_dict.get('last_seen', created_at)
+        # If the session expires, but has no created_at, it is invalid
         if created_at is None:
-            return None
-        # Check if the session has expired
+            if self.session_duration > 0 or self.session_max_lifetime > 0:
+                return None
+            return session_dict.get("user_id")
+        # Check if the session has expired, and forget it if so
         now = dt.now()
-        if created_at + timedelta(seconds=self.session_duration) < now:
-            return None
-        # Calculate the session expiration date
-        expires_at = session_dict["created_at"] + \
-            timedelta(seconds=self.session_duration)
-        # Return None if the current time is past the expiration date
-        if expires_at < dt.now():
+        expires_at = self.session_expiration(created_at, last_seen)
+        if expires_at is not None and expires_at < now:
+            self._forget_session(session_id)
             return None
+        # Record the use of the session when its last one is old enough
+        if self.needs_touch(last_seen, now):
+            session_dict['last_seen'] = now
         # Return the user_id from the session dictionary if the session
         return session_dict.get("user_id", None)
+
+    def session_expiration(self, created_at: dt, last_seen: dt) -> dt:
+        """Computes when a session expires.
+
+        Args:
+            created_at (datetime): Creation time of the session.
+            last_seen (datetime): Last recorded use of the session.
+
+        Returns:
+            datetime: The expiration time, None if the session never
+            expires.
+        """
+        expirations = []
+        if self.session_duration > 0:
+            start = last_seen if self.session_sliding and last_seen else \
+                created_at
+            expirations.append(start +
+                               timedelta(seconds=self.session_duration))
+        if self.session_max_lifetime > 0:
+            expirations.append(created_at +
+                               timedelta(seconds=self.session_max_lifetime))
+        return min(expirations) if expirations else None
+
+    def needs_touch(self, last_seen: dt, now: dt) -> bool:
+        """Tells if the last use of a session should be updated.
+
+        Args:
+            last_seen (datetime): Last recorded use of the session.
+            now (datetime): Current time.
+
+        Returns:
+            bool: True if sessions slide and `last_seen` is at least
+            touch_threshold seconds old.
+        """
+        if not self.session_sliding or self.session_duration <= 0:
+            return False
+        if last_seen is None:
+            return True
+        return now - last_seen >= timedelta(seconds=self.touch_threshold)
+
+    def sweep_expired(self, now: dt = None) -> int:
+        """Evicts the sessions expired at `now`, handling at most
+        sweep_batch of them.
+
+        Args:
+            now (datetime, optional): Time to compare expirations to.
+            Defaults to the current time.
+
+        Returns:
+            int: The number of sessions evicted.
+        """
+        now = now or dt.now()
+        evicted = handled = 0
+        with self._expirations_lock:
+            heap = self._expirations
+            while heap and heap[0][0] < now and handled < self.sweep_batch:
+                expires_at, session_id = heapq.heappop(heap)
+                handled += 1
+                session_dict = self.user_id_by_session_id.get(session_id)
+                # Sessions destroyed already are not counted
+                if not isinstance(session_dict, dict):
+                    continue
+                # Sessions used since they were scheduled expire later
+                expires_at = self.session_expiration(
+                    session_dict.get('created_at'),
+                    session_dict.get('last_seen'))
+                if expires_at is not None and expires_at >= now:
+                    heapq.heappush(heap, (expires_at, session_id))
+                    continue
+                self._forget_session(session_id)
+                evicted += 1
+            self.expired_count += evicted
+            self._swept = handled
+        return evicted
+
+    def _sweep_loop(self):
+        """Body of the sweeper thread: evicts the expired sessions batch
+        by batch, every sweep_interval seconds.
+        """
+        while not self._stop_sweeper.wait(self.sweep_interval):
+            # Release the lock between batches to let logins in
+            self.sweep_expired()
+            while self._swept >= self.sweep_batch:
+                self.sweep_expired()
+
+    def stop_sweeper(self):
+        """Stops the sweeper thread.
+        """
+        self._stop_sweeper.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+            self._sweeper = None
+
+    def session_stats(self) -> dict:
+        """Counts the sessions.
+
+        Returns:
+            dict: `live` sessions, `expired` sessions not evicted yet and
+            `evicted` sessions since the start.
+        """
+        now = dt.now()
+        with self._expirations_lock:
+            expired = 0
+            for expires_at, session_id in self._expirations:
+                session_dict = self.user_id_by_session_id.get(session_id)
+                if expires_at >= now or not isinstance(session_dict, dict):
+                    continue
+                expires_at = self.session_expiration(
+                    session_dict.get('created_at'),
+                    session_dict.get('last_seen'))
+                if expires_at is not None and expires_at < now:
+                    expired += 1
+            return {
+                'live': len(self.user_id_by_session_id) - expired,
+                'expired': expired,
+                'evicted': self.expired_count,
+            }
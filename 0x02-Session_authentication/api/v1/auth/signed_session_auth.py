@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Module for signed session authentication
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from uuid import uuid4
+
+from .session_auth import SessionAuth
+
+
+def _b64encode(data: bytes) -> str:
+    """URL safe Base64 text of bytes, without padding.
+    """
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(text: str) -> bytes:
+    """Bytes of an URL safe Base64 text without padding.
+    """
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+class SignedSessionAuth(SessionAuth):
+    """Session authentication with self-contained signed session IDs.
+
+    The session ID is `<key id>.<payload>.<signature>`, the payload being
+    the user ID, issue time, expiration time and a unique token ID, and
+    the signature its HMAC-SHA256 under the key. Checking a session needs
+    no stored state, so any process holding the keys accepts it.
+
+    Keys come from SESSION_SIGNING_KEYS, as `kid:secret` pairs separated
+    by commas. The first key signs new sessions, the others are still
+    accepted, which lets keys rotate. Without keys, a random one is made
+    and sessions don't survive a restart.
+
+    Signed sessions always expire, after SESSION_DURATION seconds or a
+    day when it is not set, since a session can't be deleted: logged out
+    sessions are kept in a revocation list until they expire, at most
+    SESSION_REVOCATION_SIZE of them. When the list is full of sessions
+    still valid, logging out one session logs its user out everywhere
+    instead. This list is local to the process.
+
+    Like user_id_by_session_id, the fallback key and the revocation list
+    are shared by every instance of the process.
+
+    Args:
+        SessionAuth (type): Class inherited from.
+    """
+    DEFAULT_DURATION = 24 * 60 * 60
+    _local_key = os.urandom(32)
+    # token ID -> expiration time of the revoked sessions
+    _revoked = {}
+    # user ID -> time before which its sessions are revoked
+    _revoked_before = {}
+    _revoked_lock = threading.Lock()
+
+    def __init__(self):
+        """Initializes the signing keys and the revocation list.
+        """
+        super().__init__()
+        self.session_duration = int(os.environ.get("SESSION_DURATION", 0))
+        if self.session_duration <= 0:
+            self.session_duration = self.DEFAULT_DURATION
+        self.keys = {}
+        self.signing_key_id = None
+        for pair in os.environ.get("SESSION_SIGNING_KEYS", "").split(","):
+            key_id, _, secret = pair.strip().partition(":")
+            if not key_id or not secret:
+                continue
+            self.keys[key_id] = secret.encode('utf-8')
+            if self.signing_key_id is None:
+                self.signing_key_id = key_id
+        if self.signing_key_id is None:
+            self.signing_key_id = "local"
+            self.keys["local"] = self._local_key
+        self.revocation_size = int(
+            os.environ.get("SESSION_REVOCATION_SIZE", 10000))
+
+    def _sign(self, key_id: str, payload: str) -> str:
+        """Signs a payload with a key.
+        """
+        message = "{}.{}".format(key_id, payload).encode('ascii')
+        return _b64encode(hmac.new(self.keys[key_id], message,
+                                   hashlib.sha256).digest())
+
+    def create_session(self, user_id: str = None) -> str:
+        """Creates a signed session ID for user_id.
+
+        Args:
+            user_id (str, optional): ID of user to create a session for.
+            Defaults to None.
+
+        Returns:
+            str: The session ID if the user ID is valid, None otherwise.
+        """
+        if type(user_id) is not str:
+            return None
+        now = time.time()
+        claims = {'uid': user_id, 'iat': now, 'jti': uuid4().hex,
+                  'exp': int(now) + self.session_duration}
+        payload = _b64encode(json.dumps(claims,
+                                        separators=(',', ':')).encode())
+        key_id = self.signing_key_id
+        return "{}.{}.{}".format(key_id, payload, self._sign(key_id, payload))
+
+    def _claims(self, session_id: str) -> dict:
+        """Returns the claims of a valid session ID, None otherwise.
+        """
+        if type(session_id) is not str or session_id.count(".") != 2:
+            return None
+        if not session_id.isascii():
+            # Not one of ours, and it could not be signed or compared
+            return None
+        key_id, payload, signature = session_id.split(".")
+        if key_id not in self.keys:
+            return None
+        if not hmac.compare_digest(self._sign(key_id, payload), signature):
+            return None
+        try:
+            claims = json.loads(_b64decode(payload))
+        except (binascii.Error, ValueError):
+            return None
+        if type(claims) is not dict or \
+                type(claims.get('exp')) not in (int, float) or \
+                claims['exp'] < time.time():
+            return None
+        if claims.get('jti') in self._revoked:
+            return None
+        revoked_before = self._revoked_before.get(claims.get('uid'))
+        if revoked_before is not None and claims.get('iat', 0) < \
+                revoked_before:
+            return None
+        return claims
+
+    def user_id_for_session_id(self, session_id: str = None) -> str:
+        """Retrieves the user ID of a signed session ID.
+
+        Args:
+            session_id (str, optional): session ID to retrieve the user
+            ID for. Defaults to None.
+
+        Returns:
+            str: The user ID if the session ID is valid, None otherwise.
+        """
+        claims = self._claims(session_id)
+        if claims is None:
+            return None
+        return claims.get('uid')
+
+    def destroy_session(self, request=None) -> bool:
+        """Revokes the session of a request until it expires.
+
+        Args:
+            request (flask.request, optional): Flask request object.
+            Defaults to None.
+
+        Returns:
+            bool: True if the session was revoked, False otherwise.
+        """
+        if request is None:
+            return False
+        claims = self._claims(self.session_cookie(request))
+        if claims is None:
+            return False
+        with self._revoked_lock:
+            if len(self._revoked) >= self.revocation_size:
+                self._prune_revoked()
+            if len(self._revoked) < self.revocation_size:
+                self._revoked[claims.get('jti')] = claims['exp']
+            else:
+                # Forgetting a revoked session would make it valid again
+                self._revoke_before(claims.get('uid'))
+        return True
+
+    def destroy_all_sessions(self, user_id: str) -> int:
+        """Revokes every session of a user issued until now.
+
+        Args:
+            user_id (str): ID of the user to log out everywhere.
+
+        Returns:
+            int: 0, since the sessions of a user are not known.
+        """
+        with self._revoked_lock:
+            self._revoke_before(user_id)
+        return 0
+
+    def _revoke_before(self, user_id: str):
+        """Revokes the sessions of a user issued until now, the revocation
+        lock being held.
+
+        Revocation times are kept in the order they were set, so the ones
+        older than a session duration, which only concern expired
+        sessions, are forgotten from the front.
+        """
+        now = time.time()
+        self._revoked_before.pop(user_id, None)
+        self._revoked_before[user_id] = now
+        while True:
+            oldest = next(iter(self._revoked_before))
+            if self._revoked_before[oldest] + self.session_duration >= now:
+                break
+            del self._revoked_before[oldest]
+
+    def _prune_revoked(self):
+        """Forgets the revoked sessions which expired.
+        """
+        now = time.time()
+        expired = [jti for jti, expires_at in self._revoked.items()
+                   if expires_at < now]
+        for jti in expired:
+            del self._revoked[jti]
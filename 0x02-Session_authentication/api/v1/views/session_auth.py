@@ -63,3 +63,16 @@ def session_auth_logout():
         abort(404)
     # Otherwise, return an empty JSON dictionary with the status code 200
     return jsonify({}), 200
+
+
+@app_views.route(
+    '/auth_session/logout_all', methods=['DELETE'], strict_slashes=False)
+def session_auth_logout_all():
+    """DELETE /api/v1/auth_session/logout_all
+
+    Returns:
+        - JSON object with the number of sessions deleted.
+    """
+    # Delete every session of the authenticated user
+    count = auth.destroy_all_sessions(request.current_user.id)
+    return jsonify({"sessions": count}), 200
@@ -1,20 +1,175 @@
 #!/usr/bin/env python3
 """ Module of Users views
 """
-from flask import abort, jsonify, request
+import base64
+import binascii
+import json
+from datetime import datetime
+from itertools import islice
+from typing import Iterator
+
+from flask import Response, abort, jsonify, request
 
 from api.v1.views import app_views
+from models.base import TIMESTAMP_FORMAT, Prefix, Range
 from models.user import User
 
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+SORT_FIELDS = ('created_at', 'updated_at', 'email', 'first_name',
+               'last_name')
+
+
+def encode_cursor(user: User, order_by: str = 'created_at') -> str:
+    """ Cursor of the page starting after `user`, ordered by `order_by`
+    """
+    key = json.dumps(list(user.order_key(order_by)))
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('utf-8')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """ Order key encoded in `cursor`, ValueError if it is invalid
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError("invalid cursor")
+    if not isinstance(key, list) or len(key) != 2 or \
+            not isinstance(key[0], (str, type(None))) or \
+            not isinstance(key[1], str):
+        raise ValueError("invalid cursor")
+    return tuple(key)
+
+
+def search_attributes(args: dict) -> dict:
+    """ `User.search()` attributes of the filters in query `args`,
+    ValueError if a date is invalid
+    """
+    attributes = {}
+    if args.get('email') is not None:
+        attributes['email'] = args.get('email')
+    if args.get('email_prefix') is not None:
+        attributes['email'] = Prefix(args.get('email_prefix'))
+    if args.get('first_name') is not None:
+        attributes['first_name'] = args.get('first_name')
+    after, before = args.get('created_after'), args.get('created_before')
+    if after is not None or before is not None:
+        if after is not None:
+            after = datetime.strptime(after, TIMESTAMP_FORMAT)
+        if before is not None:
+            before = datetime.strptime(before, TIMESTAMP_FORMAT)
+        attributes['created_at'] = Range(after=after, before=before)
+    return attributes
+
+
+def sort_key(order_key: tuple) -> tuple:
+    """ Comparable form of an `order_key()`, None values first like in
+    the sorted indexes
+    """
+    value, user_id = order_key
+    return (value is not None, "" if value is None else value, user_id)
+
+
+def iter_users(attributes: dict = None, order_by: str = 'created_at',
+               descending: bool = False,
+               after: tuple = None) -> Iterator[User]:
+    """ Yield the users matching `attributes` ordered by `order_by`,
+    starting after the order key `after`
+
+    Without filters, ordered by a sorted attribute, users are read one
+    page at a time from its sorted index, backwards when `descending`.
+    Otherwise the matching users are found by `User.search()` and sorted.
+    """
+    if not attributes and order_by in User._sorted_attributes:
+        while True:
+            users = User.page(after=after, limit=PAGE_SIZE,
+                              order_by=order_by, descending=descending)
+            yield from users
+            if len(users) < PAGE_SIZE:
+                return
+            after = users[-1].order_key(order_by)
+
+    def key(user: User) -> tuple:
+        return sort_key(user.order_key(order_by))
+
+    users = sorted(User.search(attributes or {}), key=key,
+                   reverse=descending)
+    if after is None:
+        yield from users
+        return
+    start = sort_key(after)
+    for user in users:
+        if (key(user) < start) if descending else (key(user) > start):
+            yield user
+
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters:
+      - limit (optional): number of users of the page, up to 1000
+      - cursor (optional): `next_cursor` of the previous page
+      - format (optional): `ndjson` for one User JSON object per line
+      - email, email_prefix, first_name (optional): filters
+      - created_after, created_before (optional): filters on the creation
+        date, as YYYY-MM-DDTHH:MM:SS
+      - sort (optional): created_at, updated_at, email, first_name or
+        last_name, prefixed with `-` for descending order
     Return:
-      - list of all User objects JSON represented
+      - list of the matching User objects JSON represented, ordered by
+        creation date or `sort`, and streamed
+      - with `limit` or `cursor`: one page as `users`, and `next_cursor`
+        (null on the last page)
+      - 400 if a parameter is invalid
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    if request.args.get('email') is not None and \
+            request.args.get('email_prefix') is not None:
+        return jsonify({'error': "Use either email or email_prefix"}), 400
+    try:
+        attributes = search_attributes(request.args)
+    except ValueError:
+        return jsonify({'error': "Wrong date format"}), 400
+    sort = request.args.get('sort', 'created_at')
+    descending = sort.startswith('-')
+    order_by = sort[1:] if descending else sort
+    if order_by not in SORT_FIELDS:
+        return jsonify({'error': "Wrong sort field"}), 400
+
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    after = None
+    try:
+        if cursor is not None:
+            after = decode_cursor(cursor)
+        if limit is not None:
+            limit = int(limit)
+            if limit <= 0 or limit > MAX_PAGE_SIZE:
+                raise ValueError()
+    except ValueError:
+        return jsonify({'error': "Wrong limit or cursor"}), 400
+
+    users = iter_users(attributes, order_by, descending, after)
+    if limit is not None or cursor is not None:
+        limit = limit or PAGE_SIZE
+        users = list(islice(users, limit))
+        next_cursor = None
+        if len(users) == limit:
+            next_cursor = encode_cursor(users[-1], order_by)
+        return jsonify({'users': [user.to_json() for user in users],
+                        'next_cursor': next_cursor})
+
+    if request.args.get('format') == 'ndjson':
+        lines = (json.dumps(user.to_json()) + "\n" for user in users)
+        return Response(lines, mimetype='application/x-ndjson')
+
+    def generate() -> Iterator[str]:
+        """ Chunks of the JSON array of the users
+        """
+        yield "["
+        for i, user in enumerate(users):
+            yield ("," if i > 0 else "") + json.dumps(user.to_json())
+        yield "]\n"
+    return Response(generate(), mimetype='application/json')
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -63,6 +218,11 @@ def delete_user(user_id: str = None) -> str:
     if user is None:
         abort(404)
     user.remove()
+    # Log the deleted user out everywhere. auth is imported here since
+    # api.v1.app imports this module
+    from api.v1.app import auth
+    if auth is not None:
+        auth.destroy_all_sessions(user_id)
     return jsonify({}), 200
 
 
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+""" Password hashing benchmark: logins per second on one core for each
+PASSWORD_HASHER setting, to choose the cost of new hashes
+
+A login is `User.is_valid_password()` on a user whose hash was made
+with the setting. bcrypt settings are skipped without the bcrypt
+package.
+
+Usage: ./bench_hashers.py [seconds per setting]
+"""
+import sys
+import time
+
+from models import hashers
+from models.user import User
+
+# (PASSWORD_HASHER, cost variables of models.hashers)
+SETTINGS = [
+    ('sha256', {}),
+    ('pbkdf2_sha256', {'PBKDF2_ITERATIONS': 100000}),
+    ('pbkdf2_sha256', {'PBKDF2_ITERATIONS': 260000}),
+    ('pbkdf2_sha256', {'PBKDF2_ITERATIONS': 600000}),
+    ('scrypt', {'SCRYPT_N': 2 ** 14}),
+    ('scrypt', {'SCRYPT_N': 2 ** 15}),
+    ('bcrypt', {'BCRYPT_ROUNDS': 10}),
+    ('bcrypt', {'BCRYPT_ROUNDS': 12}),
+]
+
+
+def logins_per_second(password: str, duration: float) -> float:
+    """ Rate of successful logins of a user with `password`, hashed with
+    the current settings, over at least `duration` seconds
+    """
+    user = User()
+    user.password = password
+    logins = 0
+    start = time.perf_counter()
+    while True:
+        if not user.is_valid_password(password):
+            raise AssertionError("login failed")
+        logins += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration and logins >= 3:
+            return logins / elapsed
+
+
+def main():
+    """ Print the logins per second of each setting
+    """
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    print("{:<16} {:<28} {:>12} {:>10}".format(
+        "PASSWORD_HASHER", "cost", "logins/s", "ms/login"))
+    for algorithm, cost in SETTINGS:
+        cost_text = " ".join("{}={}".format(name, value)
+                             for name, value in cost.items()) or "-"
+        if algorithm == 'bcrypt':
+            try:
+                import bcrypt  # noqa: F401
+            except ImportError:
+                print("{:<16} {:<28} skipped, no bcrypt package".format(
+                    algorithm, cost_text))
+                continue
+        hashers.PASSWORD_HASHER = algorithm
+        for name, value in cost.items():
+            setattr(hashers, name, value)
+        rate = logins_per_second("H0lbertonSchool98!", duration)
+        print("{:<16} {:<28} {:>12.1f} {:>10.2f}".format(
+            algorithm, cost_text, rate, 1000 / rate))
+
+
+if __name__ == "__main__":
+    main()
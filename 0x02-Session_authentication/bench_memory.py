@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+""" Memory benchmark: bytes per resident User and UserSession, measured
+with tracemalloc
+
+Compares the layout of the models before `__slots__` (attributes in a
+per instance `__dict__`, timestamps parsed to datetimes) to the current
+one, then measures a table loaded by the storage, indexes included.
+
+Usage: ./bench_memory.py [rows]
+"""
+from datetime import datetime
+import gc
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+import uuid
+
+from models.engine.storage import TIMESTAMP_FORMAT
+from models.user import User
+from models.user_session import UserSession
+
+
+class DictRow():
+    """ Layout of the models before `__slots__`
+    """
+
+    def __init__(self, **kwargs):
+        """ Keep every attribute in `__dict__`, with parsed timestamps
+        """
+        for key, value in kwargs.items():
+            if key in ('created_at', 'updated_at'):
+                value = datetime.strptime(value, TIMESTAMP_FORMAT)
+            setattr(self, key, value)
+
+
+def users_json(rows: int) -> str:
+    """ Serialized users, as found in a snapshot
+    """
+    now = datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+    return json.dumps([{
+        'id': str(uuid.uuid4()),
+        'created_at': now,
+        'updated_at': now,
+        'email': "user{}@example.com".format(i),
+        '_password': uuid.uuid4().hex + uuid.uuid4().hex,
+        'first_name': "First{}".format(i),
+        'last_name': "Last{}".format(i),
+    } for i in range(rows)])
+
+
+def sessions_json(rows: int) -> str:
+    """ Serialized sessions, ten per user, as found in a snapshot
+    """
+    now = datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+    user_ids = [str(uuid.uuid4()) for _ in range(rows // 10 + 1)]
+    sessions = []
+    for i in range(rows):
+        session_id = str(uuid.uuid4())
+        sessions.append({
+            'id': session_id,
+            'created_at': now,
+            'updated_at': now,
+            'user_id': user_ids[i // 10],
+            'session_id': session_id,
+        })
+    return json.dumps(sessions)
+
+
+def bytes_per_row(make: type, text: str, rows: int) -> float:
+    """ Memory held by a table of `rows` objects made by `make` from
+    the serialized `text`, per object
+    """
+    gc.collect()
+    tracemalloc.start()
+    objs_json = json.loads(text)
+    table = {}
+    for obj_json in objs_json:
+        obj = make(**obj_json)
+        table[obj.id] = obj
+    del objs_json, obj_json, obj
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del table
+    return size / rows
+
+
+def loaded_bytes_per_row(cls: type, text: str, rows: int) -> float:
+    """ Memory held by the table and indexes of `cls` loaded from a
+    snapshot, per object
+    """
+    with open(".db_{}.json".format(cls.__name__), 'w') as f:
+        json.dump({obj['id']: obj for obj in json.loads(text)}, f)
+    gc.collect()
+    tracemalloc.start()
+    cls.load_from_file(background=False)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / rows
+
+
+def main():
+    """ Print the bytes per row of each layout
+    """
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    os.chdir(tempfile.mkdtemp(prefix="bench_memory_"))
+    print("{} rows, bytes per row:".format(rows))
+    print("{:<12} {:>10} {:>10} {:>16}".format(
+        "", "__dict__", "__slots__", "loaded+indexes"))
+    for cls, make_json in ((User, users_json),
+                           (UserSession, sessions_json)):
+        text = make_json(rows)
+        before = bytes_per_row(DictRow, text, rows)
+        after = bytes_per_row(cls, text, rows)
+        loaded = loaded_bytes_per_row(cls, text, rows)
+        print("{:<12} {:>10.0f} {:>10.0f} {:>16.0f}".format(
+            cls.__name__, before, after, loaded))
+
+
+if __name__ == "__main__":
+    main()
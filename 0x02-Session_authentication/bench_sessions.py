@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+""" SessionDBAuth benchmark: session lookup, create and destroy times
+with many stored sessions (1M by default)
+
+The sessions are written to a snapshot, loaded, then each operation is
+timed on random sessions: lookups go to the storage, cached lookups
+through `current_user()`.
+
+Usage: ./bench_sessions.py [stored sessions] [operations]
+"""
+from datetime import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+from api.v1.auth.session_db_auth import SessionDBAuth
+from models.engine.storage import TIMESTAMP_FORMAT
+from models.user import User
+from models.user_session import UserSession
+
+
+class Request():
+    """ Request carrying a session cookie
+    """
+
+    def __init__(self, session_id: str):
+        """ Set the session cookie
+        """
+        self.cookies = {os.environ['SESSION_NAME']: session_id}
+
+
+def write_sessions(count: int, user_ids: list) -> list:
+    """ Write a snapshot of `count` sessions of `user_ids`, and return
+    their session ids
+    """
+    now = datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+    session_ids = []
+    with open(".db_UserSession.ndjson", 'w') as f:
+        for i in range(count):
+            session_id = str(uuid.uuid4())
+            session_ids.append(session_id)
+            f.write(json.dumps({
+                'id': session_id,
+                'created_at': now,
+                'updated_at': now,
+                'user_id': user_ids[i % len(user_ids)],
+                'session_id': session_id,
+            }) + "\n")
+    return session_ids
+
+
+def timed(name: str, operation, args: list):
+    """ Run `operation` on each of `args` and print the time per call
+    """
+    start = time.perf_counter()
+    for arg in args:
+        operation(arg)
+    elapsed = time.perf_counter() - start
+    print("{:<16} {:>10.1f} us/op".format(name, elapsed / len(args) * 1e6))
+
+
+def main():
+    """ Load the sessions and time each operation
+    """
+    stored = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    os.environ.setdefault('SESSION_NAME', '_my_session_id')
+    os.chdir(tempfile.mkdtemp(prefix="bench_sessions_"))
+
+    users = []
+    with User.batch():
+        for i in range(1000):
+            user = User()
+            user.email = "user{}@example.com".format(i)
+            user.save()
+            users.append(user)
+    session_ids = write_sessions(stored, [user.id for user in users])
+    start = time.perf_counter()
+    User.load_from_file(background=False)
+    UserSession.load_from_file(background=False)
+    print("{} sessions loaded in {:.1f}s".format(
+        UserSession.count(), time.perf_counter() - start))
+
+    auth = SessionDBAuth()
+    sample = random.sample(session_ids, operations)
+    timed("lookup", auth.user_id_for_session_id, sample)
+    timed("current_user", lambda session_id: auth.current_user(
+        Request(session_id)), sample)
+    timed("cached lookup", lambda session_id: auth.current_user(
+        Request(session_id)), sample)
+    timed("create", auth.create_session,
+          [random.choice(users).id for _ in range(operations)])
+    timed("destroy", lambda session_id: auth.destroy_session(
+        Request(session_id)), sample)
+    if any(auth.user_id_for_session_id(session_id) is not None
+           for session_id in sample):
+        print("destroyed sessions are still valid")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,36 +2,110 @@
 """ Base module
 """
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
-import json
+from typing import Callable, Iterator, TypeVar, List, Iterable
 import uuid
 
+from models.engine import storage
+from models.engine.storage import TIMESTAMP_FORMAT, Predicate, Prefix, Range
 
-TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
-DATA = {}
+
+class _Timestamp():
+    """ Datetime attribute parsed from its string form on first access
+
+    The value is stored in the `_<name>` slot of the instance.
+    """
+
+    def __set_name__(self, owner: type, name: str):
+        """ Remember the slot holding the value
+        """
+        self.slot = "_{}".format(name)
+
+    def __get__(self, obj: object, owner: type = None) -> datetime:
+        """ Return the datetime, parsing the stored string if needed
+        """
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if type(value) is str:
+            value = datetime.strptime(value, TIMESTAMP_FORMAT)
+            setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj: object, value):
+        """ Store a datetime or its TIMESTAMP_FORMAT string
+        """
+        setattr(obj, self.slot, value)
+
+    def raw(self, obj: object) -> str:
+        """ Return the value as a TIMESTAMP_FORMAT string, without
+        parsing it
+        """
+        value = getattr(obj, self.slot, None)
+        if type(value) is datetime:
+            return value.strftime(TIMESTAMP_FORMAT)
+        return value
 
 
 class Base():
     """ Base class
+
+    Objects are kept by the storage engine of `models.engine`, selected
+    with STORAGE_TYPE. Subclasses can list attributes in
+    `_indexed_attributes` to get them indexed by the engine, so equality
+    searches on those attributes don't scan every object, and in
+    `_sorted_attributes` to page through objects in that order.
+    `_storage_mode` overrides DB_STORAGE_MODE for the class in the file
+    storage.
+
+    Attributes live in `__slots__`, which subclasses extend with their
+    own, to keep millions of resident objects small.
     """
+    __slots__ = ('id', '_created_at', '_updated_at')
+    _indexed_attributes = ()
+    _sorted_attributes = ('created_at',)
+    _storage_mode = None
+    created_at = _Timestamp()
+    updated_at = _Timestamp()
+
+    def __init_subclass__(cls, **kwargs):
+        """ Collect the serialized attributes of a subclass
+        """
+        super().__init_subclass__(**kwargs)
+        cls._json_fields = cls._collect_json_fields()
+        cls._listeners = []
+        storage.register(cls)
+
+    @classmethod
+    def _collect_json_fields(cls) -> tuple:
+        """ Return (JSON key, slot) pairs of all slots of the class
+
+        Timestamp slots are serialized under their public name.
+        """
+        fields = []
+        for klass in reversed(cls.__mro__):
+            slots = klass.__dict__.get('__slots__', ())
+            if isinstance(slots, str):
+                slots = (slots,)
+            for slot in slots:
+                if slot in ('__dict__', '__weakref__'):
+                    continue
+                key = slot
+                if isinstance(klass.__dict__.get(slot[1:]), _Timestamp):
+                    key = slot[1:]
+                fields.append((key, slot))
+        return tuple(fields)
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
-        s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
-
         self.id = kwargs.get('id', str(uuid.uuid4()))
+        # Stored timestamps are kept as strings until first accessed
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = kwargs.get('created_at')
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = kwargs.get('updated_at')
         else:
             self.updated_at = datetime.utcnow()
 
@@ -48,7 +122,12 @@ class Base():
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        items = []
+        for key, slot in self._json_fields:
+            if hasattr(self, slot):
+                items.append((key, getattr(self, slot)))
+        items.extend(getattr(self, '__dict__', {}).items())
+        for key, value in items:
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -57,56 +136,74 @@ class Base():
                 result[key] = value
         return result
 
+    def order_key(self, attr: str = 'created_at') -> tuple:
+        """ Return the (value, ID) key ordering the object by `attr`
+
+        Timestamps are given as TIMESTAMP_FORMAT strings, which sort
+        like the datetimes they represent. This is also the value that
+        search predicates are checked against.
+        """
+        descriptor = getattr(self.__class__, attr, None)
+        if isinstance(descriptor, _Timestamp):
+            return (descriptor.raw(self), self.id)
+        return (getattr(self, attr, None), self.id)
+
     @classmethod
-    def load_from_file(cls):
+    def load_from_file(cls, progress: Callable[[int], None] = None,
+                       background: bool = None):
         """ Load all objects from file
+
+        See `FileStorage.load()`; engines that don't keep objects in
+        memory have nothing to load.
+        """
+        return storage.load(cls, progress, background)
+
+    @staticmethod
+    def flush():
+        """ Write every pending change now
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+        storage.flush()
+
+    @staticmethod
+    def batch() -> Iterator[None]:
+        """ Group the writes of the current thread until the block exits
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        Loading many objects inside `with Base.batch():` writes each
+        class once instead of once per object.
+        """
+        return storage.batch()
 
     @classmethod
-    def save_to_file(cls):
-        """ Save all objects to file
+    def add_listener(cls, callback: Callable[[str, TypeVar('Base')], None]):
+        """ Call `callback(event, obj)` after each `save()` ("save" event)
+        or `remove()` ("remove" event) of an object of the class
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        cls._listeners.append(callback)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    def _notify(self, event: str):
+        """ Tell the listeners of the class about a change
+        """
+        for callback in self.__class__._listeners:
+            callback(event, self)
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        storage.save(self)
+        self._notify('save')
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        storage.remove(self)
+        self._notify('remove')
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return storage.count(cls)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -114,24 +211,36 @@ class Base():
         """
         return cls.search()
 
+    @classmethod
+    def page(cls, after: tuple = None, limit: int = 100,
+             order_by: str = 'created_at',
+             descending: bool = False) -> List[TypeVar('Base')]:
+        """ Return up to `limit` objects ordered by `order_by` then ID,
+        or in the reverse order if `descending`
+
+        `order_by` must be one of `_sorted_attributes`. The page starts
+        after the `order_key()` given as `after`, or at the first object.
+        """
+        if order_by not in cls._sorted_attributes:
+            raise ValueError("{} is not sorted by {}".format(
+                cls.__name__, order_by))
+        return storage.page(cls, order_by, after, limit, descending)
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return storage.get(cls, id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+
+        Values can be `Prefix` or `Range` predicates, answered from the
+        sorted index of the attribute when it is in `_sorted_attributes`.
         """
-        s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+        return storage.search(cls, attributes)
+
+
+Base._json_fields = Base._collect_json_fields()
+Base._listeners = []
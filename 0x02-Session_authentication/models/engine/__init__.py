@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+""" Storage engine selected by the STORAGE_TYPE environment variable
+"""
+from os import getenv
+
+from models.engine.file_storage import FileStorage
+from models.engine.sqlite_storage import SQLiteStorage
+
+storage_type = getenv('STORAGE_TYPE', 'file')
+if storage_type == 'sqlite':
+    storage = SQLiteStorage()
+else:
+    storage = FileStorage()
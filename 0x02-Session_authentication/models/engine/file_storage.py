@@ -0,0 +1,767 @@
+#!/usr/bin/env python3
+""" File storage module
+"""
+from contextlib import contextmanager
+from os import getenv, path
+import bisect
+from typing import Callable, Iterable, Iterator, List, TypeVar
+import atexit
+import json
+import os
+import threading
+
+from models.engine.storage import Predicate, Prefix, Range, Storage
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+DATA = {}
+INDEXES = {}
+SORTED = {}
+# "file" rewrites .db_<Class>.json on every change, "log" appends each
+# change to .db_<Class>.log and compacts it into the JSON snapshot once
+# it holds DB_LOG_COMPACT_THRESHOLD entries, and at least half as many
+# entries as objects so rewriting the snapshot stays O(1) per change
+STORAGE_MODE = getenv('DB_STORAGE_MODE', 'file')
+LOG_COMPACT_THRESHOLD = int(getenv('DB_LOG_COMPACT_THRESHOLD', 1000))
+LOG_SIZES = {}
+# Group commit: with DB_FLUSH_INTERVAL > 0, changes are queued and written
+# by a background thread every DB_FLUSH_INTERVAL seconds, or as soon as
+# DB_FLUSH_COUNT changes are pending; save() and remove() return once
+# their change is on disk. DB_FSYNC=1 fsyncs every write.
+FLUSH_INTERVAL = float(getenv('DB_FLUSH_INTERVAL', 0))
+FLUSH_COUNT = int(getenv('DB_FLUSH_COUNT', 100))
+FSYNC = getenv('DB_FSYNC', '0').lower() in ('1', 'true', 'yes')
+# "json" keeps the snapshot as one JSON dict, "ndjson" writes one object
+# per line so it can be loaded as a stream. With DB_BACKGROUND_LOAD=1
+# load_from_file() returns at once and objects become visible as they
+# are read, to page() once loading is done; writes of the class wait
+# until loading is done.
+FILE_FORMAT = getenv('DB_FILE_FORMAT', 'json')
+BACKGROUND_LOAD = getenv('DB_BACKGROUND_LOAD', '0').lower() in (
+    '1', 'true', 'yes')
+LOAD_PROGRESS_EVERY = 10000
+LOADED = {}
+# With DB_SHARED=1 several processes can use the same files: writes hold
+# an advisory lock on .db_<Class>.lock, and before reading or writing a
+# class each process catches up with the changes made by the others,
+# replaying only the new log entries unless the snapshot was rewritten.
+SHARED = getenv('DB_SHARED', '0').lower() in ('1', 'true', 'yes')
+LOG_OFFSETS = {}
+SEEN = {}
+
+
+class _GroupCommit():
+    """ Queue of pending changes written in batches
+    """
+
+    def __init__(self, write: Callable[[type, List[dict]], None]):
+        """ Initialize an empty queue writing batches with `write`
+        """
+        self.write = write
+        self.cond = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.local = threading.local()
+        self.pending = {}
+        self.size = 0
+        self.queued = 0
+        self.flushed = 0
+        self.failed = 0
+        self.thread = None
+
+    def add(self, cls: type, entry: dict) -> int:
+        """ Queue a change of `cls` and return its ticket
+        """
+        with self.cond:
+            self.pending.setdefault(cls.__name__, (cls, []))[1].append(entry)
+            self.size += 1
+            self.queued += 1
+            if FLUSH_COUNT > 0 and self.size >= FLUSH_COUNT:
+                self.cond.notify_all()
+            return self.queued
+
+    def flush(self):
+        """ Write every pending change, one write per class
+        """
+        with self.write_lock:
+            with self.cond:
+                pending, self.pending = self.pending, {}
+                ticket, self.size = self.queued, 0
+            try:
+                for cls, entries in pending.values():
+                    self.write(cls, entries)
+            except Exception:
+                with self.cond:
+                    self.failed = ticket
+                raise
+            finally:
+                with self.cond:
+                    self.flushed = max(self.flushed, ticket)
+                    self.cond.notify_all()
+
+    def wait(self, ticket: int):
+        """ Block until the batch holding `ticket` has been written
+        """
+        with self.cond:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            self.cond.wait_for(lambda: self.flushed >= ticket)
+            if self.failed >= ticket:
+                raise IOError("Batch {} could not be written".format(ticket))
+
+    def _run(self):
+        """ Flush on interval or once enough changes are pending
+        """
+        while True:
+            with self.cond:
+                self.cond.wait_for(
+                    lambda: FLUSH_COUNT > 0 and self.size >= FLUSH_COUNT,
+                    timeout=FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                # Waiters of the failed batch are told by wait()
+                pass
+
+    @property
+    def batching(self) -> bool:
+        """ Tell if the current thread is inside a batch
+        """
+        return getattr(self.local, 'depth', 0) > 0
+
+
+def _sync(f):
+    """ Flush a file to disk when DB_FSYNC is set
+    """
+    if FSYNC:
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class FileStorage(Storage):
+    """ Storage keeping every object in memory, persisted to
+    .db_<Class>.json (or .ndjson) snapshots and change logs
+
+    Classes can list attributes in `_indexed_attributes` to get a hash
+    index kept current by `save()`, `remove()` and `load()`, so equality
+    searches on those attributes don't scan every object. Attributes in
+    `_sorted_attributes` get a sorted list of keys used by `page()`.
+
+    The in-memory table and indexes of a class are only changed under
+    its mutex, held for one dict update. Searches and snapshot writes
+    copy the object references they need under it, then filter or
+    serialize without it, so reads never wait on file I/O.
+    """
+
+    def __init__(self):
+        """ Initialize the storage and its group commit queue
+        """
+        self.group_commit = _GroupCommit(self._write)
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+        self.mutexes = {}
+        # Classes being loaded, whose sorted indexes are built at the end
+        self.loading = set()
+        atexit.register(self.group_commit.flush)
+
+    def register(self, cls: type):
+        """ Create the in-memory table of a class
+        """
+        self.mutexes.setdefault(cls.__name__, threading.Lock())
+        if DATA.get(cls.__name__) is None:
+            DATA[cls.__name__] = {}
+
+    def load(self, cls: type, progress: Callable[[int], None] = None,
+             background: bool = None):
+        """ Load all objects of `cls` from file
+
+        The snapshot is loaded first, then the changes appended to the
+        log since the last compaction are replayed on top of it.
+        `progress` is called with the number of objects read every
+        LOAD_PROGRESS_EVERY objects and once loading is done. In the
+        background, the loading thread is returned.
+        """
+        if background is None:
+            background = BACKGROUND_LOAD
+        self.group_commit.flush()
+        self._reset(cls)
+        if not background:
+            self._load(cls, progress)
+            return None
+        thread = threading.Thread(target=self._load, args=(cls, progress),
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def _reset(cls: type):
+        """ Empty the in-memory table of a class before loading it
+        """
+        s_class = cls.__name__
+        DATA[s_class] = {}
+        INDEXES[s_class] = None
+        SORTED[s_class] = None
+        LOG_SIZES[s_class] = 0
+        LOG_OFFSETS[s_class] = 0
+        LOADED[s_class] = threading.Event()
+
+    def _load(self, cls: type, progress: Callable[[int], None] = None):
+        """ Read the snapshot and the log of the class into memory
+
+        Sorted indexes are built once all objects are read, rather than
+        inserting each key in order.
+        """
+        s_class = cls.__name__
+        count = 0
+        self.loading.add(s_class)
+        try:
+            with self._lock(cls):
+                for obj_json in self._read_snapshot(cls):
+                    self._store(cls(**obj_json))
+                    count += 1
+                    if progress is not None and \
+                            count % LOAD_PROGRESS_EVERY == 0:
+                        progress(count)
+                self._replay_log(cls)
+                SEEN[s_class] = self._signature(cls)
+        finally:
+            with self._mutex(cls):
+                self.loading.discard(s_class)
+                SORTED[s_class] = self._build_sorted(
+                    cls, list(DATA[s_class].values()))
+            LOADED[s_class].set()
+        if progress is not None:
+            progress(count)
+
+    @staticmethod
+    def _log_entries(cls: type, offset: int) -> Iterator[tuple]:
+        """ Yield the log entries of the class from `offset`, each with
+        its length in bytes
+        """
+        log_path = ".db_{}.log".format(cls.__name__)
+        if not path.exists(log_path):
+            return
+        with open(log_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Entry still being appended, or torn by a crash
+                    break
+                yield json.loads(line), len(line)
+
+    def _replay_log(self, cls: type):
+        """ Apply the log entries appended since LOG_OFFSETS
+        """
+        s_class = cls.__name__
+        for entry, size in self._log_entries(cls,
+                                             LOG_OFFSETS.get(s_class, 0)):
+            if entry.get('op') == 'save':
+                self._store(cls(**entry.get('obj')))
+            elif entry.get('op') == 'remove':
+                self._discard(cls, entry.get('id'))
+            LOG_SIZES[s_class] += 1
+            LOG_OFFSETS[s_class] += size
+
+    def _reload(self, cls: type):
+        """ Read the snapshot and the log of the class into new tables and
+        indexes, then swap them in, so readers keep seeing the previous
+        table until the new one is complete
+        """
+        s_class = cls.__name__
+        objs = {}
+        for obj_json in self._read_snapshot(cls):
+            obj = cls(**obj_json)
+            objs[obj.id] = obj
+        log_size = log_offset = 0
+        for entry, size in self._log_entries(cls, 0):
+            if entry.get('op') == 'save':
+                obj = cls(**entry.get('obj'))
+                objs[obj.id] = obj
+            elif entry.get('op') == 'remove':
+                objs.pop(entry.get('id'), None)
+            log_size += 1
+            log_offset += size
+        indexes = {attr: ({}, {}) for attr in cls._indexed_attributes}
+        for obj in objs.values():
+            self._index_add(obj, indexes, {})
+        sorted_indexes = self._build_sorted(cls, list(objs.values()))
+        with self._mutex(cls):
+            DATA[s_class] = objs
+            INDEXES[s_class] = indexes
+            SORTED[s_class] = sorted_indexes
+        LOG_SIZES[s_class] = log_size
+        LOG_OFFSETS[s_class] = log_offset
+
+    @staticmethod
+    def _signature(cls: type) -> tuple:
+        """ Return what identifies the current files of a class: inode,
+        mtime and size of the snapshot, and size of the log
+        """
+        snapshot = None
+        for file_path in FileStorage._snapshot_paths(cls):
+            if path.exists(file_path):
+                st = os.stat(file_path)
+                snapshot = (file_path, st.st_ino, st.st_mtime_ns, st.st_size)
+                break
+        log_path = ".db_{}.log".format(cls.__name__)
+        log_size = os.stat(log_path).st_size if path.exists(log_path) else 0
+        return (snapshot, log_size)
+
+    @contextmanager
+    def _lock(self, cls: type) -> Iterator[None]:
+        """ Hold the lock of a class, across threads and, when SHARED,
+        across processes
+        """
+        s_class = cls.__name__
+        with self.locks_lock:
+            if s_class not in self.locks:
+                self.locks[s_class] = [threading.RLock(), None, 0]
+            lock = self.locks[s_class]
+        with lock[0]:
+            if lock[2] == 0 and SHARED and fcntl is not None:
+                lock[1] = open(".db_{}.lock".format(s_class), 'a')
+                fcntl.flock(lock[1].fileno(), fcntl.LOCK_EX)
+            lock[2] += 1
+            try:
+                yield
+            finally:
+                lock[2] -= 1
+                if lock[2] == 0 and lock[1] is not None:
+                    fcntl.flock(lock[1].fileno(), fcntl.LOCK_UN)
+                    lock[1].close()
+                    lock[1] = None
+
+    def _refresh(self, cls: type, keep: Iterable[str] = ()):
+        """ Catch up with the changes other processes made to a class
+
+        Objects in `keep`, or with changes still pending here, keep
+        their in-memory version.
+        """
+        if not SHARED:
+            return
+        s_class = cls.__name__
+        loaded = LOADED.get(s_class)
+        if loaded is not None and not loaded.is_set():
+            # Still loading in the background
+            return
+        if SEEN.get(s_class) == self._signature(cls):
+            return
+        with self._lock(cls):
+            signature = self._signature(cls)
+            seen = SEEN.get(s_class)
+            if seen == signature:
+                return
+            keep = set(keep)
+            with self.group_commit.cond:
+                pending = self.group_commit.pending.get(s_class)
+                if pending is not None:
+                    keep.update(entry['id'] for entry in pending[1])
+            kept = {obj_id: DATA[s_class].get(obj_id) for obj_id in keep}
+            if seen is None or seen[0] != signature[0] or \
+                    signature[1] < LOG_OFFSETS.get(s_class, 0):
+                # Snapshot rewritten (or log compacted): reload it all
+                self._reload(cls)
+            else:
+                self._replay_log(cls)
+            SEEN[s_class] = self._signature(cls)
+            for obj_id, obj in kept.items():
+                if obj is None:
+                    self._discard(cls, obj_id)
+                else:
+                    self._store(obj)
+
+    @staticmethod
+    def _snapshot_paths(cls: type) -> List[str]:
+        """ Return the snapshot paths of the class, FILE_FORMAT first
+        """
+        s_class = cls.__name__
+        paths = [".db_{}.json".format(s_class),
+                 ".db_{}.ndjson".format(s_class)]
+        if FILE_FORMAT == 'ndjson':
+            paths.reverse()
+        return paths
+
+    def _read_snapshot(self, cls: type) -> Iterator[dict]:
+        """ Yield the serialized objects of the snapshot one at a time
+
+        A snapshot in the other format is read too, so switching
+        DB_FILE_FORMAT keeps existing data.
+        """
+        for file_path in self._snapshot_paths(cls):
+            if not path.exists(file_path):
+                continue
+            with open(file_path, 'r') as f:
+                if file_path.endswith('.ndjson'):
+                    for line in f:
+                        if line.strip():
+                            yield json.loads(line)
+                else:
+                    yield from json.load(f).values()
+            return
+
+    def save_to_file(self, cls: type):
+        """ Save all objects of `cls` to file
+
+        The snapshot is written to a temporary file then renamed over the
+        previous one, after which the change log is emptied.
+        """
+        s_class = cls.__name__
+        file_path, other_path = self._snapshot_paths(cls)
+        tmp_path = "{}.{}.tmp".format(file_path, os.getpid())
+        with self._mutex(cls):
+            objs = list(DATA[s_class].values())
+        with open(tmp_path, 'w') as f:
+            if FILE_FORMAT == 'ndjson':
+                for obj in objs:
+                    f.write(json.dumps(obj.to_json(True)) + "\n")
+            else:
+                objs_json = {}
+                for obj in objs:
+                    objs_json[obj.id] = obj.to_json(True)
+                json.dump(objs_json, f)
+            _sync(f)
+        os.replace(tmp_path, file_path)
+        if path.exists(other_path):
+            os.remove(other_path)
+
+        log_path = ".db_{}.log".format(s_class)
+        if LOG_SIZES.get(s_class) or path.exists(log_path):
+            open(log_path, 'w').close()
+        LOG_SIZES[s_class] = 0
+        LOG_OFFSETS[s_class] = 0
+
+    def append_to_log(self, cls: type, entries: List[dict]):
+        """ Append changes to the log of the class
+
+        The log is compacted into the snapshot once it holds
+        LOG_COMPACT_THRESHOLD entries and half as many as objects.
+        """
+        s_class = cls.__name__
+        with open(".db_{}.log".format(s_class), 'a') as f:
+            f.write("".join(json.dumps(e) + "\n" for e in entries))
+            _sync(f)
+        LOG_SIZES[s_class] = LOG_SIZES.get(s_class, 0) + len(entries)
+        if LOG_SIZES[s_class] >= max(LOG_COMPACT_THRESHOLD,
+                                     len(DATA.get(s_class, {})) // 2):
+            self.save_to_file(cls)
+
+    @staticmethod
+    def _mode(cls: type) -> str:
+        """ Storage mode of `cls`: its `_storage_mode`, or STORAGE_MODE
+        """
+        return cls._storage_mode or STORAGE_MODE
+
+    def _write(self, cls: type, entries: List[dict]):
+        """ Write a batch of changes according to the storage mode
+        """
+        loaded = LOADED.get(cls.__name__)
+        if loaded is not None:
+            loaded.wait()
+        with self._lock(cls):
+            self._refresh(cls, keep=[entry['id'] for entry in entries])
+            if self._mode(cls) == 'log':
+                self.append_to_log(cls, entries)
+            else:
+                self.save_to_file(cls)
+            if SHARED:
+                SEEN[cls.__name__] = self._signature(cls)
+                LOG_OFFSETS[cls.__name__] = SEEN[cls.__name__][1]
+
+    def _persist(self, op: str, obj: TypeVar('Base')):
+        """ Persist one change, through the group commit queue
+        """
+        entry = {'op': op, 'id': obj.id}
+        if op == 'save' and self._mode(obj.__class__) == 'log':
+            entry['obj'] = obj.to_json(True)
+        ticket = self.group_commit.add(obj.__class__, entry)
+        if self.group_commit.batching:
+            return
+        if FLUSH_INTERVAL > 0:
+            self.group_commit.wait(ticket)
+        else:
+            self.group_commit.flush()
+
+    def flush(self):
+        """ Write every pending change now
+        """
+        self.group_commit.flush()
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """ Defer writes of the current thread until the block exits
+
+        Loading many objects inside the block writes each class once
+        instead of once per object.
+        """
+        local = self.group_commit.local
+        local.depth = getattr(local, 'depth', 0) + 1
+        try:
+            yield
+        finally:
+            local.depth -= 1
+            if local.depth == 0:
+                self.group_commit.flush()
+
+    def _mutex(self, cls: type) -> threading.Lock:
+        """ Return the lock guarding the in-memory table of a class
+        """
+        mutex = self.mutexes.get(cls.__name__)
+        if mutex is None:
+            mutex = self.mutexes.setdefault(cls.__name__, threading.Lock())
+        return mutex
+
+    def _store(self, obj: TypeVar('Base')):
+        """ Put an object in memory and in the indexes
+        """
+        with self._mutex(obj.__class__):
+            DATA[obj.__class__.__name__][obj.id] = obj
+            self._index_add(obj)
+
+    def _discard(self, cls: type, obj_id: str):
+        """ Drop an object from memory and from the indexes
+        """
+        with self._mutex(cls):
+            if DATA[cls.__name__].pop(obj_id, None) is not None:
+                self._index_remove(cls, obj_id)
+
+    def save(self, obj: TypeVar('Base')):
+        """ Store or replace an object
+        """
+        self._store(obj)
+        self._persist('save', obj)
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete an object
+        """
+        if DATA[obj.__class__.__name__].get(obj.id) is not None:
+            self._discard(obj.__class__, obj.id)
+            self._persist('remove', obj)
+
+    @staticmethod
+    def _indexes(cls: type) -> dict:
+        """ Return the attribute indexes of the class
+
+        Each index maps an attribute to a pair of dicts: value -> ids
+        (an insertion ordered dict used as a set) and id -> indexed value.
+        """
+        s_class = cls.__name__
+        if INDEXES.get(s_class) is None:
+            INDEXES[s_class] = {attr: ({}, {})
+                                for attr in cls._indexed_attributes}
+        return INDEXES[s_class]
+
+    def _index_add(self, obj: TypeVar('Base'), indexes: dict = None,
+                   sorted_indexes: dict = None):
+        """ Add or refresh an object in the attribute indexes, those of
+        its class unless `indexes` and `sorted_indexes` are given
+        """
+        if indexes is None:
+            indexes = self._indexes(obj.__class__)
+        if sorted_indexes is None:
+            if obj.__class__.__name__ in self.loading:
+                sorted_indexes = {}
+            else:
+                sorted_indexes = self._sorted(obj.__class__)
+        for attr, (ids_by_value, value_by_id) in indexes.items():
+            value = getattr(obj, attr, None)
+            if obj.id in value_by_id:
+                old_value = value_by_id[obj.id]
+                if old_value == value:
+                    continue
+                self._index_discard(ids_by_value, old_value, obj.id)
+            try:
+                ids_by_value.setdefault(value, {})[obj.id] = None
+            except TypeError:
+                # Unhashable values can't be indexed, search falls back
+                # to a scan for them
+                continue
+            value_by_id[obj.id] = value
+
+        for attr, (keys, key_by_id) in sorted_indexes.items():
+            key = self._sort_key(obj.order_key(attr))
+            old_key = key_by_id.get(obj.id)
+            if old_key == key:
+                continue
+            if old_key is not None:
+                self._sorted_discard(keys, old_key)
+            bisect.insort(keys, key)
+            key_by_id[obj.id] = key
+
+    def _index_remove(self, cls: type, obj_id: str):
+        """ Remove an object ID from the attribute indexes
+        """
+        for ids_by_value, value_by_id in self._indexes(cls).values():
+            if obj_id in value_by_id:
+                value = value_by_id.pop(obj_id)
+                self._index_discard(ids_by_value, value, obj_id)
+        for keys, key_by_id in self._sorted(cls).values():
+            if obj_id in key_by_id:
+                self._sorted_discard(keys, key_by_id.pop(obj_id))
+
+    @staticmethod
+    def _sorted(cls: type) -> dict:
+        """ Return the sorted indexes of the class
+
+        Each index maps an attribute to a sorted list of `_sort_key()`s
+        and a dict of id -> key.
+        """
+        s_class = cls.__name__
+        if SORTED.get(s_class) is None:
+            SORTED[s_class] = {attr: ([], {})
+                               for attr in cls._sorted_attributes}
+        return SORTED[s_class]
+
+    def _build_sorted(self, cls: type, objs: List[TypeVar('Base')]) -> dict:
+        """ Return the sorted indexes of `objs`, each list sorted once
+        """
+        sorted_indexes = {}
+        for attr in cls._sorted_attributes:
+            key_by_id = {obj.id: self._sort_key(obj.order_key(attr))
+                         for obj in objs}
+            sorted_indexes[attr] = (sorted(key_by_id.values()), key_by_id)
+        return sorted_indexes
+
+    @staticmethod
+    def _sort_key(order_key: tuple) -> tuple:
+        """ Make an `order_key()` comparable when its value is None
+        """
+        value, obj_id = order_key
+        if value is None:
+            return (False, "", obj_id)
+        return (True, value, obj_id)
+
+    @staticmethod
+    def _sorted_discard(keys: list, key: tuple):
+        """ Remove a key from a sorted list of keys
+        """
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+
+    @staticmethod
+    def _index_discard(ids_by_value: dict, value, obj_id: str):
+        """ Discard an object ID from the bucket of a value
+        """
+        ids = ids_by_value.get(value)
+        if ids is None:
+            return
+        ids.pop(obj_id, None)
+        if len(ids) == 0:
+            del ids_by_value[value]
+
+    def page(self, cls: type, order_by: str, after: tuple = None,
+             limit: int = 100,
+             descending: bool = False) -> List[TypeVar('Base')]:
+        """ Return up to `limit` objects of `cls` ordered by the
+        `order_key()` of `order_by`, starting after the key `after`
+
+        In descending order, the sorted keys are read backwards.
+        """
+        self._refresh(cls)
+        with self._mutex(cls):
+            keys = self._sorted(cls)[order_by][0]
+            if descending:
+                end = len(keys)
+                if after is not None:
+                    end = bisect.bisect_left(keys, self._sort_key(after))
+                selected = keys[max(0, end - limit):end][::-1]
+            else:
+                start = 0
+                if after is not None:
+                    start = bisect.bisect_right(keys, self._sort_key(after))
+                selected = keys[start:start + limit]
+            objs = DATA[cls.__name__]
+            return [objs[key[2]] for key in selected if key[2] in objs]
+
+    def count(self, cls: type) -> int:
+        """ Count all objects of `cls`
+        """
+        self._refresh(cls)
+        return len(DATA[cls.__name__].keys())
+
+    def get(self, cls: type, obj_id: str) -> TypeVar('Base'):
+        """ Return the object of `cls` with ID `obj_id`, or None
+        """
+        self._refresh(cls)
+        return DATA[cls.__name__].get(obj_id)
+
+    def search(self, cls: type,
+               attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Return all objects of `cls` with matching attributes
+
+        Candidates come from the narrowest hash index (for values) or
+        sorted index (for predicates) among the attributes, then are
+        checked against every attribute.
+        """
+        def _search(obj):
+            if len(attributes) == 0:
+                return True
+            for k, v in attributes.items():
+                if isinstance(v, Predicate):
+                    if not v.matches(obj.order_key(k)[0]):
+                        return False
+                elif (getattr(obj, k) != v):
+                    return False
+            return True
+
+        self._refresh(cls)
+        with self._mutex(cls):
+            objs = DATA[cls.__name__]
+            candidates = None
+            indexes = self._indexes(cls)
+            sorted_indexes = self._sorted(cls)
+            for k, v in attributes.items():
+                if isinstance(v, Predicate):
+                    if k not in sorted_indexes:
+                        continue
+                    ids = self._sorted_ids(sorted_indexes[k][0], v)
+                    if ids is None:
+                        continue
+                elif k in indexes:
+                    try:
+                        ids = indexes[k][0].get(v, {})
+                    except TypeError:
+                        continue
+                else:
+                    continue
+                if candidates is None or len(ids) < len(candidates):
+                    candidates = ids
+            if candidates is not None:
+                objs = [objs[obj_id] for obj_id in candidates
+                        if obj_id in objs]
+            else:
+                objs = list(objs.values())
+        return list(filter(_search, objs))
+
+    @staticmethod
+    def _sorted_ids(keys: list, predicate: Predicate) -> List[str]:
+        """ Return the IDs of the sorted keys matching a predicate, found
+        by bisection, or None for predicates that can't use the index
+        """
+        try:
+            if isinstance(predicate, Prefix):
+                i = bisect.bisect_left(keys, (True, predicate.prefix))
+                ids = []
+                while i < len(keys) and predicate.matches(keys[i][1]):
+                    ids.append(keys[i][2])
+                    i += 1
+                return ids
+            if isinstance(predicate, Range):
+                # (True,) sorts after the keys of None values
+                start = bisect.bisect_left(keys, (True,))
+                end = len(keys)
+                if predicate.after is not None:
+                    start = bisect.bisect_left(keys, (True, predicate.after))
+                if predicate.before is not None:
+                    end = bisect.bisect_left(keys, (True, predicate.before))
+                while start < end and keys[start][1] == predicate.after:
+                    start += 1
+                return [key[2] for key in keys[start:end]]
+        except TypeError:
+            # Values of mixed types can't be bisected
+            pass
+        return None
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+""" SQLite storage module
+"""
+from contextlib import contextmanager
+from os import getenv
+from typing import Iterator, List, TypeVar
+import json
+import sqlite3
+import threading
+
+from models.engine.storage import (Predicate, Prefix, Range, Storage,
+                                   sort_value)
+
+
+SQLITE_DB_PATH = getenv('SQLITE_DB_PATH', '.db.sqlite3')
+SQLITE_BUSY_TIMEOUT = int(getenv('SQLITE_BUSY_TIMEOUT', 5000))
+
+
+class SQLiteStorage(Storage):
+    """ Storage keeping objects in a SQLite database shared by every
+    process using the same file
+
+    Each class gets a table holding the serialized object, with its ID,
+    `_indexed_attributes` and `_sorted_attributes` copied into indexed
+    columns. The database runs in WAL mode so readers don't block the
+    writer.
+    """
+
+    def __init__(self, db_path: str = SQLITE_DB_PATH):
+        """ Initialize the storage on the database file `db_path`
+        """
+        self.db_path = db_path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.ready = set()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """ Connection of the current thread, opened on first use
+        """
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: autocommit outside of `batch()`
+            conn = sqlite3.connect(self.db_path,
+                                   timeout=SQLITE_BUSY_TIMEOUT / 1000,
+                                   isolation_level=None,
+                                   cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout={:d}".format(
+                SQLITE_BUSY_TIMEOUT))
+            self.local.conn = conn
+            self.local.depth = 0
+        return conn
+
+    @staticmethod
+    def _columns(cls: type) -> List[str]:
+        """ Return the indexed columns of the table of `cls`
+        """
+        columns = ['id', 'created_at']
+        for attr in cls._indexed_attributes + cls._sorted_attributes:
+            if attr not in columns:
+                columns.append(attr)
+        return columns
+
+    def _table(self, cls: type) -> str:
+        """ Return the quoted table name of `cls`, creating the table and
+        its indexes if needed
+        """
+        s_class = cls.__name__
+        table = '"{}"'.format(s_class)
+        if s_class in self.ready:
+            return table
+        with self.lock:
+            conn = self.connection
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS {} (id TEXT PRIMARY KEY, "
+                "created_at TEXT, data TEXT NOT NULL)".format(table))
+            existing = [row[1] for row in
+                        conn.execute("PRAGMA table_info({})".format(table))]
+            for column in self._columns(cls):
+                if column not in existing:
+                    # Columns indexed after the table was created are
+                    # filled from the serialized objects
+                    conn.execute("ALTER TABLE {} ADD COLUMN \"{}\"".format(
+                        table, column))
+                    conn.execute(
+                        "UPDATE {} SET \"{}\" = json_extract(data, ?)".format(
+                            table, column), ("$.{}".format(column),))
+                if column != 'id' and column not in cls._sorted_attributes:
+                    conn.execute(
+                        "CREATE INDEX IF NOT EXISTS \"ix_{}_{}\" "
+                        "ON {} (\"{}\")".format(s_class, column, table,
+                                                column))
+            for column in cls._sorted_attributes:
+                # Serves page() ordering and keyset conditions
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS \"ix_{}_{}_id\" "
+                    "ON {} (\"{}\", id)".format(s_class, column, table,
+                                                column))
+            self.ready.add(s_class)
+        return table
+
+    @staticmethod
+    def _value(value):
+        """ Convert an attribute value to its column value
+        """
+        return sort_value(value)
+
+    def save(self, obj: TypeVar('Base')):
+        """ Insert or update an object, keeping its row position
+        """
+        cls = obj.__class__
+        table = self._table(cls)
+        obj_json = obj.to_json(True)
+        columns = self._columns(cls)
+        values = [self._value(obj_json.get(column)) for column in columns]
+        values.append(json.dumps(obj_json))
+        names = ", ".join('"{}"'.format(column) for column in columns)
+        updates = ", ".join('"{0}" = excluded."{0}"'.format(column)
+                            for column in columns[1:] + ['data'])
+        self.connection.execute(
+            "INSERT INTO {} ({}, data) VALUES ({}) ON CONFLICT(id) "
+            "DO UPDATE SET {}".format(table, names,
+                                      ", ".join("?" * len(values)), updates),
+            values)
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete an object
+        """
+        table = self._table(obj.__class__)
+        self.connection.execute(
+            "DELETE FROM {} WHERE id = ?".format(table), (obj.id,))
+
+    def get(self, cls: type, obj_id: str) -> TypeVar('Base'):
+        """ Return the object of `cls` with ID `obj_id`, or None
+        """
+        table = self._table(cls)
+        row = self.connection.execute(
+            "SELECT data FROM {} WHERE id = ?".format(table),
+            (obj_id,)).fetchone()
+        if row is None:
+            return None
+        return cls(**json.loads(row[0]))
+
+    def search(self, cls: type,
+               attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Return all objects of `cls` with matching attributes
+
+        Attributes stored in a column are matched by SQLite through its
+        index, the others are compared on the loaded objects.
+        """
+        table = self._table(cls)
+        columns = self._columns(cls)
+        where, params, others = [], [], {}
+        for k, v in attributes.items():
+            if k not in columns:
+                others[k] = v
+            elif isinstance(v, Prefix):
+                where.append('"{}" >= ?'.format(k))
+                params.append(v.prefix)
+                if v.upper() is None:
+                    others[k] = v
+                else:
+                    where.append('"{}" < ?'.format(k))
+                    params.append(v.upper())
+            elif isinstance(v, Range):
+                where.append('"{}" IS NOT NULL'.format(k))
+                if v.after is not None:
+                    where.append('"{}" > ?'.format(k))
+                    params.append(v.after)
+                if v.before is not None:
+                    where.append('"{}" < ?'.format(k))
+                    params.append(v.before)
+            elif v is None:
+                where.append('"{}" IS NULL'.format(k))
+            else:
+                where.append('"{}" = ?'.format(k))
+                params.append(self._value(v))
+        query = "SELECT data FROM {}".format(table)
+        if len(where) > 0:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY rowid"
+
+        result = []
+        for row in self.connection.execute(query, params):
+            obj = cls(**json.loads(row[0]))
+            if all(v.matches(obj.order_key(k)[0])
+                   if isinstance(v, Predicate) else getattr(obj, k) == v
+                   for k, v in others.items()):
+                result.append(obj)
+        return result
+
+    def page(self, cls: type, order_by: str, after: tuple = None,
+             limit: int = 100,
+             descending: bool = False) -> List[TypeVar('Base')]:
+        """ Return up to `limit` objects of `cls` ordered by the
+        `order_key()` of `order_by`, starting after the key `after`
+
+        NULL values come first, like in the file storage, and last in
+        descending order.
+        """
+        table = self._table(cls)
+        query = "SELECT data FROM {}".format(table)
+        params = []
+        if after is not None and not descending:
+            value, obj_id = after
+            if value is None:
+                query += ' WHERE ("{0}" IS NULL AND id > ?) OR ' \
+                         '"{0}" IS NOT NULL'.format(order_by)
+                params.append(obj_id)
+            else:
+                query += ' WHERE ("{}", id) > (?, ?)'.format(order_by)
+                params.extend([self._value(value), obj_id])
+        elif after is not None:
+            value, obj_id = after
+            if value is None:
+                query += ' WHERE "{}" IS NULL AND id < ?'.format(order_by)
+                params.append(obj_id)
+            else:
+                query += ' WHERE ("{0}", id) < (?, ?) OR ' \
+                         '"{0}" IS NULL'.format(order_by)
+                params.extend([self._value(value), obj_id])
+        direction = " DESC" if descending else ""
+        query += ' ORDER BY "{0}"{1}, id{1} LIMIT ?'.format(
+            order_by, direction)
+        params.append(limit)
+        return [cls(**json.loads(row[0]))
+                for row in self.connection.execute(query, params)]
+
+    def count(self, cls: type) -> int:
+        """ Count all objects of `cls`
+        """
+        table = self._table(cls)
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM {}".format(table)).fetchone()[0]
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """ Run the writes of the current thread in one transaction,
+        rolled back if the block raises
+        """
+        conn = self.connection
+        if self.local.depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        self.local.depth += 1
+        try:
+            yield
+        except BaseException:
+            self.local.depth -= 1
+            if self.local.depth == 0:
+                conn.execute("ROLLBACK")
+                with self.lock:
+                    # Tables created in the transaction are gone too
+                    self.ready.clear()
+            raise
+        self.local.depth -= 1
+        if self.local.depth == 0:
+            conn.execute("COMMIT")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+""" Storage module
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterator, List, TypeVar
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def sort_value(value):
+    """ Value as stored in sorted indexes: datetimes become
+    TIMESTAMP_FORMAT strings, which sort the same way
+    """
+    if type(value) is datetime:
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value
+
+
+class Predicate():
+    """ Condition on an attribute, usable in `Base.search()` attributes
+    in place of a value to be equal to
+
+    Engines use the sorted index of the attribute, when there is one, to
+    find the matching objects without a scan.
+    """
+
+    def matches(self, value) -> bool:
+        """ Tell if an attribute value satisfies the condition
+        """
+        raise NotImplementedError()
+
+
+class Prefix(Predicate):
+    """ String attribute starting with `prefix`
+    """
+
+    def __init__(self, prefix: str):
+        """ Initialize the predicate
+        """
+        self.prefix = prefix
+
+    def matches(self, value) -> bool:
+        """ Tell if `value` starts with the prefix
+        """
+        return isinstance(value, str) and value.startswith(self.prefix)
+
+    def upper(self) -> str:
+        """ Smallest string greater than every string with the prefix,
+        None if there is no bound
+        """
+        if self.prefix == "" or ord(self.prefix[-1]) >= 0x10FFFF:
+            return None
+        return self.prefix[:-1] + chr(ord(self.prefix[-1]) + 1)
+
+
+class Range(Predicate):
+    """ Attribute strictly between `after` and `before`, either of them
+    being optional; None values never match
+    """
+
+    def __init__(self, after=None, before=None):
+        """ Initialize the predicate
+        """
+        self.after = sort_value(after)
+        self.before = sort_value(before)
+
+    def matches(self, value) -> bool:
+        """ Tell if `value` is in the range
+        """
+        value = sort_value(value)
+        if value is None:
+            return False
+        if self.after is not None and not value > self.after:
+            return False
+        if self.before is not None and not value < self.before:
+            return False
+        return True
+
+
+class Storage():
+    """ Template for all storage engines behind `models.base.Base`
+
+    An engine stores the objects of each class registered with it and
+    answers the `Base` lookups (`get`, `search`, `count`) for them.
+    """
+
+    def register(self, cls: type):
+        """ Prepare the storage of a new model class
+        """
+        pass
+
+    def load(self, cls: type, progress: Callable[[int], None] = None,
+             background: bool = None):
+        """ Load the persisted objects of `cls`, if the engine keeps them
+        in memory
+        """
+        pass
+
+    def save(self, obj: TypeVar('Base')):
+        """ Store or replace an object
+        """
+        raise NotImplementedError()
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete an object
+        """
+        raise NotImplementedError()
+
+    def get(self, cls: type, obj_id: str) -> TypeVar('Base'):
+        """ Return the object of `cls` with ID `obj_id`, or None
+        """
+        raise NotImplementedError()
+
+    def search(self, cls: type,
+               attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Return all objects of `cls` with matching attributes
+
+        An attribute matches if it is equal to the value given for it,
+        or if the value is a `Predicate` it satisfies.
+        """
+        raise NotImplementedError()
+
+    def page(self, cls: type, order_by: str, after: tuple = None,
+             limit: int = 100,
+             descending: bool = False) -> List[TypeVar('Base')]:
+        """ Return up to `limit` objects of `cls` ordered by the
+        `order_key()` of `order_by`, starting after the key `after`
+        """
+        raise NotImplementedError()
+
+    def count(self, cls: type) -> int:
+        """ Count all objects of `cls`
+        """
+        raise NotImplementedError()
+
+    def flush(self):
+        """ Write every pending change now
+        """
+        pass
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """ Group the writes of the current thread until the block exits
+        """
+        yield
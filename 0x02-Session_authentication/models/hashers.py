@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+""" Password hashers module
+
+Hashes are stored tagged with their algorithm and parameters, e.g.
+`pbkdf2_sha256$<iterations>$<salt>$<hash>`, so the algorithm used for
+new passwords (PASSWORD_HASHER) and its cost can change while existing
+hashes keep verifying. Untagged 64 hex digit hashes are the legacy
+single round SHA256 of `User`.
+"""
+from os import getenv
+import base64
+import hashlib
+import hmac
+import os
+
+
+PASSWORD_HASHER = getenv('PASSWORD_HASHER', 'sha256')
+PBKDF2_ITERATIONS = int(getenv('PBKDF2_ITERATIONS', 260000))
+SCRYPT_N = int(getenv('SCRYPT_N', 2 ** 14))
+SCRYPT_R = int(getenv('SCRYPT_R', 8))
+SCRYPT_P = int(getenv('SCRYPT_P', 1))
+BCRYPT_ROUNDS = int(getenv('BCRYPT_ROUNDS', 12))
+
+
+def _b64(data: bytes) -> str:
+    """ Base64 text of bytes, without padding
+    """
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _unb64(text: str) -> bytes:
+    """ Bytes of a base64 text without padding
+    """
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+class Hasher():
+    """ Template for all password hashers
+    """
+    algorithm = None
+
+    def encode(self, password: str) -> str:
+        """ Hash a password with the configured parameters
+        """
+        raise NotImplementedError()
+
+    def verify(self, password: str, encoded: str) -> bool:
+        """ Check a password against one of its hashes
+        """
+        raise NotImplementedError()
+
+    def needs_update(self, encoded: str) -> bool:
+        """ Tell if a hash was made with other parameters than the
+        configured ones
+        """
+        return False
+
+
+class SHA256Hasher(Hasher):
+    """ Legacy unsalted single round SHA256, stored untagged
+    """
+    algorithm = 'sha256'
+
+    def encode(self, password: str) -> str:
+        """ Hash a password
+        """
+        return hashlib.sha256(password.encode()).hexdigest().lower()
+
+    def verify(self, password: str, encoded: str) -> bool:
+        """ Check a password against one of its hashes
+        """
+        return hmac.compare_digest(self.encode(password), encoded)
+
+
+class PBKDF2Hasher(Hasher):
+    """ PBKDF2-HMAC-SHA256 with PBKDF2_ITERATIONS iterations
+    """
+    algorithm = 'pbkdf2_sha256'
+
+    def encode(self, password: str, salt: bytes = None,
+               iterations: int = None) -> str:
+        """ Hash a password
+        """
+        salt = salt if salt is not None else os.urandom(16)
+        iterations = iterations or PBKDF2_ITERATIONS
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt,
+                                     iterations)
+        return "{}${}${}${}".format(self.algorithm, iterations, _b64(salt),
+                                    _b64(digest))
+
+    def verify(self, password: str, encoded: str) -> bool:
+        """ Check a password against one of its hashes
+        """
+        _, iterations, salt, _ = encoded.split('$')
+        return hmac.compare_digest(
+            self.encode(password, _unb64(salt), int(iterations)), encoded)
+
+    def needs_update(self, encoded: str) -> bool:
+        """ Tell if the hash used another number of iterations
+        """
+        return int(encoded.split('$')[1]) != PBKDF2_ITERATIONS
+
+
+class ScryptHasher(Hasher):
+    """ scrypt with SCRYPT_N, SCRYPT_R and SCRYPT_P costs
+    """
+    algorithm = 'scrypt'
+
+    def encode(self, password: str, salt: bytes = None,
+               cost: tuple = None) -> str:
+        """ Hash a password
+        """
+        salt = salt if salt is not None else os.urandom(16)
+        n, r, p = cost or (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                                maxmem=256 * n * r + 2 ** 20)
+        return "{}${}${}${}${}${}".format(self.algorithm, n, r, p,
+                                          _b64(salt), _b64(digest))
+
+    def verify(self, password: str, encoded: str) -> bool:
+        """ Check a password against one of its hashes
+        """
+        _, n, r, p, salt, _ = encoded.split('$')
+        cost = (int(n), int(r), int(p))
+        return hmac.compare_digest(
+            self.encode(password, _unb64(salt), cost), encoded)
+
+    def needs_update(self, encoded: str) -> bool:
+        """ Tell if the hash used other costs
+        """
+        n, r, p = (int(x) for x in encoded.split('$')[1:4])
+        return (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+class BCryptHasher(Hasher):
+    """ bcrypt with BCRYPT_ROUNDS rounds, needs the bcrypt package
+    """
+    algorithm = 'bcrypt'
+
+    def encode(self, password: str) -> str:
+        """ Hash a password
+        """
+        import bcrypt
+        digest = bcrypt.hashpw(password.encode(),
+                               bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
+        return "{}${}".format(self.algorithm, digest.decode('ascii'))
+
+    def verify(self, password: str, encoded: str) -> bool:
+        """ Check a password against one of its hashes
+        """
+        import bcrypt
+        digest = encoded[len(self.algorithm) + 1:].encode('ascii')
+        return bcrypt.checkpw(password.encode(), digest)
+
+    def needs_update(self, encoded: str) -> bool:
+        """ Tell if the hash used another number of rounds
+        """
+        # bcrypt$$2b$<rounds>$<salt and hash>
+        return int(encoded.split('$')[3]) != BCRYPT_ROUNDS
+
+
+HASHERS = {hasher.algorithm: hasher for hasher in (
+    SHA256Hasher(), PBKDF2Hasher(), ScryptHasher(), BCryptHasher())}
+
+
+def identify(encoded: str) -> Hasher:
+    """ Return the hasher of a stored hash, None if it is unknown
+    """
+    if encoded is None:
+        return None
+    if '$' not in encoded:
+        return HASHERS['sha256']
+    return HASHERS.get(encoded.split('$', 1)[0])
+
+
+def make_password(password: str) -> str:
+    """ Hash a password with the PASSWORD_HASHER algorithm
+    """
+    return HASHERS[PASSWORD_HASHER].encode(password)
+
+
+def check_password(password: str, encoded: str) -> bool:
+    """ Check a password against a stored hash of any known algorithm
+    """
+    hasher = identify(encoded)
+    if hasher is None:
+        return False
+    try:
+        return hasher.verify(password, encoded)
+    except ValueError:
+        # Malformed hash
+        return False
+
+
+def needs_rehash(encoded: str) -> bool:
+    """ Tell if a stored hash should be replaced by one made with the
+    configured algorithm and parameters
+    """
+    hasher = identify(encoded)
+    if hasher is None or hasher.algorithm != PASSWORD_HASHER:
+        return True
+    try:
+        return hasher.needs_update(encoded)
+    except (IndexError, ValueError):
+        return True
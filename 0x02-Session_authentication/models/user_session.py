@@ -1,16 +1,29 @@
 #!/usr/bin/env python3
 """Module user session
 """
+import sys
+
 from models.base import Base
 
 
 class UserSession(Base):
     """User session class.
     """
+    __slots__ = ('user_id', 'session_id')
+    _indexed_attributes = ('session_id', 'user_id')
+    # Nothing pages through sessions: a sorted index would only make
+    # each create and destroy shift a list of every session
+    _sorted_attributes = ()
+    # Sessions come and go on every login and logout: append them to
+    # the log instead of rewriting every session
+    _storage_mode = 'log'
 
     def __init__(self, *args: list, **kwargs: dict):
         """Initializes User session instance.
         """
         super().__init__(*args, **kwargs)
-        self.user_id = kwargs.get('user_id')
+        user_id = kwargs.get('user_id')
+        # Sessions of a user share one copy of the user ID
+        self.user_id = sys.intern(user_id) if type(user_id) is str \
+            else user_id
         self.session_id = kwargs.get('session_id')
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+""" Stress test of the storage: threads save, search, page through and
+remove users at once, then the table, its indexes and its file are
+checked against what each thread did
+
+Usage: ./stress_storage.py [threads] [operations per thread]
+
+Runs in a temporary directory. STORAGE_TYPE, DB_STORAGE_MODE,
+DB_FLUSH_INTERVAL and the other storage variables apply.
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from models.base import Prefix
+from models.user import User
+
+
+def worker(number: int, operations: int, kept: dict, errors: list):
+    """ Run random operations on the users of one thread, keeping the
+    ones left in `kept`
+    """
+    mine = {}
+    try:
+        for i in range(operations):
+            op = random.random()
+            if op < 0.4 or len(mine) == 0:
+                user = User()
+                user.email = "t{}-{}@stress.io".format(number, i)
+                user.save()
+                mine[user.id] = user.email
+            elif op < 0.55:
+                user = User.get(random.choice(list(mine)))
+                user.first_name = "n{}".format(i)
+                user.save()
+            elif op < 0.7:
+                user_id = random.choice(list(mine))
+                User.get(user_id).remove()
+                del mine[user_id]
+            elif op < 0.85:
+                email = random.choice(list(mine.values()))
+                found = User.search({'email': email})
+                if len(found) != 1 or found[0].email != email:
+                    raise AssertionError("search lost {}".format(email))
+            elif op < 0.95:
+                prefix = "t{}-".format(number)
+                found = User.search({'email': Prefix(prefix)})
+                if {user.id for user in found} != set(mine):
+                    raise AssertionError("prefix search of thread {} "
+                                         "is wrong".format(number))
+            else:
+                User.page(limit=50, order_by='email')
+                User.count()
+    except Exception as e:
+        errors.append("thread {}: {!r}".format(number, e))
+    kept.update(mine)
+
+
+def main():
+    """ Run the threads and check the result
+    """
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    os.chdir(tempfile.mkdtemp(prefix="stress_storage_"))
+    User.load_from_file()
+
+    kept, errors = {}, []
+    workers = [threading.Thread(target=worker,
+                                args=(n, operations, kept, errors))
+               for n in range(threads)]
+    start = time.time()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.time() - start
+    print("{} threads x {} operations in {:.2f}s ({:.0f} ops/s)".format(
+        threads, operations, elapsed, threads * operations / elapsed))
+
+    if {user.id: user.email for user in User.all()} != kept:
+        errors.append("table differs from the operations")
+    emails = [user.email for user in User.page(limit=len(kept) + 1,
+                                               order_by='email')]
+    if emails != sorted(kept.values()):
+        errors.append("email sorted index differs from the table")
+    User.load_from_file()
+    if {user.id: user.email for user in User.all()} != kept:
+        errors.append("file differs from the table")
+
+    for error in errors:
+        print(error)
+    print("{} users left, {}".format(
+        len(kept), "FAILED" if errors else "OK"))
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ import logging
 
 from flask import Flask, abort, jsonify, redirect, request
 
-from auth import Auth
+from auth import Auth, HashPoolSaturated
 
 logging.disable(logging.WARNING)
 
@@ -14,6 +14,22 @@ AUTH = Auth()
 app = Flask(__name__)
 
 
+@app.teardown_appcontext
+def close_db_session(exception=None) -> None:
+    """Releases the database session of the request.
+    """
+    AUTH.close_session()
+
+
+@app.errorhandler(HashPoolSaturated)
+def hashing_busy(error) -> str:
+    """Too many password hashes waiting: fail fast with a 503.
+    """
+    response = jsonify({"message": "service busy"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
 @app.route("/", methods=["GET"], strict_slashes=False)
 def index() -> str:
     """GET
@@ -58,13 +74,10 @@ def logout() -> str:
     """
     # Get session ID from the "session_id" cookie in the request
     session_id = request.cookies.get("session_id")
-    # Retrieve user associated with the session ID
-    user = AUTH.get_user_from_session_id(session_id)
-    # If no user is found, abort request with a 403 Forbidden error
-    if user is None:
+    # Destroy the session in one statement; if no user has it, abort
+    # request with a 403 Forbidden error
+    if not AUTH.destroy_session_by_id(session_id):
         abort(403)
-    # Destroy session associated with the user
-    AUTH.destroy_session(user.id)
     # Redirect to home route
     return redirect("/")
 
@@ -75,12 +88,13 @@ def profile() -> str:
     """
     # Get session ID from the "session_id" cookie in the request
     session_id = request.cookies.get("session_id")
-    user = AUTH.get_user_from_session_id(session_id)
+    # Only the email is needed: don't load the whole user
+    email = AUTH.get_email_from_session_id(session_id)
     # If no user is found, abort  request with a 403 Forbidden error
-    if user is None:
+    if email is None:
         abort(403)
     # Return  user's email as a JSON payload
-    return jsonify({"email": user.email})
+    return jsonify({"email": email})
 
 
 @app.route("/reset_password", methods=["POST"], strict_slashes=False)
@@ -4,7 +4,12 @@
 
 
 import logging
-from typing import Union
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
 from uuid import uuid4
 
 import bcrypt
@@ -15,6 +20,87 @@ from user import User
 
 logging.disable(logging.WARNING)
 
+# Threads running bcrypt, which releases the GIL while hashing
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", os.cpu_count() or 4))
+# Hashing jobs allowed to wait for a thread before new ones are refused
+HASH_QUEUE_DEPTH = int(os.getenv("HASH_QUEUE_DEPTH", 32))
+# Processes hashing the passwords of bulk registrations
+HASH_PROCESSES = int(os.getenv("HASH_PROCESSES", os.cpu_count() or 4))
+
+
+class HashPoolSaturated(Exception):
+    """Raised when the password hashing pool can't take more work.
+    """
+
+
+class HashPool:
+    """Bounded pool of threads running the password hashing.
+
+    At most `size` jobs run at once and `queue_depth` more wait for a
+    thread; past that, `run` fails at once with `HashPoolSaturated`
+    instead of blocking the request thread behind the queue.
+    """
+
+    def __init__(self, size: int = HASH_POOL_SIZE,
+                 queue_depth: int = HASH_QUEUE_DEPTH) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=size,
+                                            thread_name_prefix="hash")
+        self._slots = threading.BoundedSemaphore(size + queue_depth)
+        self._lock = threading.Lock()
+        self._stats = {
+            "completed": 0,
+            "rejected": 0,
+            "queue_wait": 0.0,
+            "queue_wait_max": 0.0,
+            "hash_time": 0.0,
+            "hash_time_max": 0.0,
+        }
+
+    def run(self, func: Callable, *args):
+        """Runs `func(*args)` on the pool and returns its result.
+
+        Raises:
+            HashPoolSaturated: When every thread is busy and the queue
+                is full.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise HashPoolSaturated()
+        submitted = time.monotonic()
+        try:
+            future = self._executor.submit(self._timed, submitted,
+                                           func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        return future.result()
+
+    def _timed(self, submitted: float, func: Callable, *args):
+        """Runs a job on a pool thread, recording its times.
+        """
+        started = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            done = time.monotonic()
+            self._slots.release()
+            wait, work = started - submitted, done - started
+            with self._lock:
+                stats = self._stats
+                stats["completed"] += 1
+                stats["queue_wait"] += wait
+                stats["queue_wait_max"] = max(stats["queue_wait_max"], wait)
+                stats["hash_time"] += work
+                stats["hash_time_max"] = max(stats["hash_time_max"], work)
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the pool metrics: completed and rejected jobs, total
+        and maximum seconds spent waiting in the queue and hashing.
+        """
+        with self._lock:
+            return dict(self._stats)
+
 
 def _hash_password(password: str) -> bytes:
     """Hashes password and returns bytes.
@@ -34,19 +120,44 @@ class Auth:
 
     def __init__(self):
         self._db = DB()
+        self._hash_pool = HashPool()
 
     def register_user(self, email: str, password: str) -> User:
         """Registers new user with given email and password.
         """
-        try:
-            self._db.find_user_by(email=email)
-            # If user already exist with passed email, raise a ValueError
-            raise ValueError(f"User {email} already exists")
-        except NoResultFound:
-            pass
-        hashed_password = _hash_password(password)
-        user = self._db.add_user(email, hashed_password)
-        return user
+        hashed_password = self._hash_pool.run(_hash_password, password)
+        # ValueError if the unique index on email rejects an existing user
+        return self._db.add_user(email, hashed_password)
+
+    def register_users_bulk(self, records: Iterable[Tuple[str, object]],
+                            chunk_size: int = None
+                            ) -> Tuple[int, List[Tuple[int, str, str]]]:
+        """Registers users from (email, password) records.
+
+        A str password is hashed, on a pool of HASH_PROCESSES processes;
+        a bytes one is taken as an already hashed password, such as the
+        ones of `export_users`. Records are read, hashed and inserted by
+        chunks, see `DB.add_users_bulk` for the result.
+        """
+        with ProcessPoolExecutor(max_workers=HASH_PROCESSES) as pool:
+            return self._db.add_users_bulk(
+                records, chunk_size, partial(self._hash_passwords, pool))
+
+    @staticmethod
+    def _hash_passwords(pool: ProcessPoolExecutor,
+                        passwords: List[str]) -> Iterator[bytes]:
+        """Hashes the passwords of a chunk of records on `pool`. Records
+        that will be skipped, such as the ones of existing users, are
+        filtered out before.
+        """
+        batch = max(1, len(passwords) // (HASH_PROCESSES * 4))
+        return pool.map(_hash_password, passwords, chunksize=batch)
+
+    def export_users(self) -> Iterator[Tuple[str, bytes]]:
+        """Streams the (email, hashed password) of every user, in the
+        record format of `register_users_bulk`.
+        """
+        return self._db.iter_users()
 
     def valid_login(self, email: str, password: str) -> bool:
         """Checks if  user's email and password are valid.
@@ -56,12 +167,23 @@ class Auth:
             if user is not None:
                 password_bytes = password.encode('utf-8')
                 hashed_password = user.hashed_password
-                if bcrypt.checkpw(password_bytes, hashed_password):
+                if self._hash_pool.run(bcrypt.checkpw, password_bytes,
+                                       hashed_password):
                     return True
         except NoResultFound:
             return False
         return False
 
+    def close_session(self) -> None:
+        """Releases the database session of the current request.
+        """
+        self._db.remove_session()
+
+    def hash_stats(self) -> Dict[str, float]:
+        """Returns the metrics of the password hashing pool.
+        """
+        return self._hash_pool.stats()
+
     def create_session(self, email: str) -> str:
         """Creates session and returns  session ID as a string.
         """
@@ -92,6 +214,24 @@ class Auth:
         # Otherwise return corresponding user.
         return user
 
+    def get_email_from_session_id(self, session_id: str) -> Union[str, None]:
+        """Retrieve only the email of the user of a session ID.
+        """
+        if session_id is None:
+            return None
+        row = self._db.find_user_fields(("email",), session_id=session_id)
+        return row[0] if row is not None else None
+
+    def destroy_session_by_id(self, session_id: str) -> bool:
+        """Destroys a session from its ID alone.
+
+        Returns:
+            bool: True if the session existed, False otherwise.
+        """
+        if session_id is None:
+            return False
+        return self._db.clear_session(session_id)
+
     def destroy_session(self, user_id: int) -> None:
         """Method to destroy session associated with a user
         """
@@ -126,7 +266,7 @@ class Auth:
         except NoResultFound:
             raise ValueError("Invalid reset token")
         # Hash the new password
-        new_hashed_password = _hash_password(password)
+        new_hashed_password = self._hash_pool.run(_hash_password, password)
         # Update the user's hashed password and the reset_token field to None
         self._db.update_user(
             user.id,
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Lookup benchmark: DB.find_user_by times by email, session id and
+reset token with many stored users (1M by default).
+
+The users are inserted with a session id and a reset token each, then
+each lookup is timed on random users, with the session removed after
+each one so every lookup queries the database.
+
+Usage: ./bench_lookups.py [stored users] [operations]
+
+Runs in a temporary directory, on a SQLite database unless DB_URL is
+set.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+from db import DB, DB_BULK_CHUNK
+from user import User
+
+
+def write_users(db: DB, count: int) -> list:
+    """Inserts `count` users with a session id and a reset token, and
+    returns the (email, session id, reset token) of each.
+    """
+    table = User.__table__
+    users = []
+    for start in range(0, count, DB_BULK_CHUNK):
+        rows = []
+        for i in range(start, min(start + DB_BULK_CHUNK, count)):
+            user = ("user{}@example.com".format(i),
+                    str(uuid.uuid4()), str(uuid.uuid4()))
+            users.append(user)
+            rows.append({"email": user[0], "hashed_password": "x",
+                         "session_id": user[1], "reset_token": user[2]})
+        with db._engine.begin() as connection:
+            connection.execute(table.insert(), rows)
+    return users
+
+
+def timed(name: str, operation, args: list) -> None:
+    """Runs `operation` on each of `args` and prints the time per call.
+    """
+    start = time.perf_counter()
+    for arg in args:
+        operation(arg)
+    elapsed = time.perf_counter() - start
+    print("{:<16} {:>10.1f} us/op".format(name, elapsed / len(args) * 1e6))
+
+
+def main():
+    """Fills the database and times each lookup.
+    """
+    stored = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    os.chdir(tempfile.mkdtemp(prefix="bench_lookups_"))
+    db = DB(os.getenv("DB_URL", "sqlite:///bench.db"), reset=True)
+
+    start = time.perf_counter()
+    users = write_users(db, stored)
+    print("{} users inserted in {:.1f}s".format(
+        len(users), time.perf_counter() - start))
+
+    def find(**kwargs):
+        """Finds one user, then empties the session."""
+        db.find_user_by(**kwargs)
+        db.remove_session()
+
+    sample = random.sample(users, operations)
+    timed("email", lambda user: find(email=user[0]), sample)
+    timed("session_id", lambda user: find(session_id=user[1]), sample)
+    timed("reset_token", lambda user: find(reset_token=user[2]), sample)
+
+
+if __name__ == "__main__":
+    main()
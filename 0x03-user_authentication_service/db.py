@@ -2,12 +2,16 @@
 """DB module
 """
 import logging
-from typing import Dict
+import os
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
 
-from sqlalchemy import create_engine
-from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy import create_engine, event, inspect, select, text
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm.session import Session
 
@@ -15,42 +19,325 @@ from user import Base, User
 
 logging.disable(logging.WARNING)
 
+# Database of the service, kept across restarts unless DB_RESET is set
+DB_URL = os.getenv("DB_URL", "sqlite:///a.db")
+# Log every SQL statement
+DB_ECHO = os.getenv("DB_ECHO", "0").lower() in ("1", "true", "yes")
+# Drop every table on start, for tests
+DB_RESET = os.getenv("DB_RESET", "0").lower() in ("1", "true", "yes")
+# Connections kept open, and opened on top of them under load
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+# Milliseconds SQLite waits for a lock held by another connection
+DB_BUSY_TIMEOUT = int(os.getenv("DB_BUSY_TIMEOUT", 5000))
+# Records per transaction of add_users_bulk and per query of iter_users,
+# under the 999 parameters older SQLite versions allow in a query
+DB_BULK_CHUNK = int(os.getenv("DB_BULK_CHUNK", 500))
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Configures each new SQLite connection: WAL journal so readers
+    don't block the writer, and waiting for locks instead of failing.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout={:d}".format(DB_BUSY_TIMEOUT))
+    cursor.close()
+
+
+def _create_tables(connection) -> None:
+    """Migration 1: creates the tables missing from the database.
+    """
+    Base.metadata.create_all(connection)
+
+
+def _create_user_indexes(connection) -> None:
+    """Migration 2: creates the unique indexes of the users table.
+
+    Fails with an IntegrityError if the table holds duplicates.
+    """
+    existing = {index["name"] for index in
+                inspect(connection).get_indexes(User.__tablename__)}
+    for index in User.__table__.indexes:
+        if index.name not in existing:
+            index.create(connection)
+
+
+def _create_schema_version(connection) -> None:
+    """Creates the table of applied versions, or rebuilds one created
+    without its primary key.
+    """
+    if not connection.dialect.has_table(connection, "schema_version"):
+        connection.execute(text(
+            "CREATE TABLE schema_version (version INTEGER PRIMARY KEY)"))
+        return
+    if inspect(connection).get_pk_constraint("schema_version")[
+            "constrained_columns"]:
+        return
+    connection.execute(text(
+        "CREATE TABLE schema_version_pk (version INTEGER PRIMARY KEY)"))
+    connection.execute(text(
+        "INSERT INTO schema_version_pk (version) "
+        "SELECT DISTINCT version FROM schema_version"))
+    connection.execute(text("DROP TABLE schema_version"))
+    connection.execute(text(
+        "ALTER TABLE schema_version_pk RENAME TO schema_version"))
+
+
+# Schema migrations as (version, function applying it on a connection),
+# in version order. Applied versions are recorded in `schema_version`:
+# append new migrations, never change applied ones.
+MIGRATIONS = [
+    (1, _create_tables),
+    (2, _create_user_indexes),
+]
+
 
 class DB:
     """db class
     """
 
-    def __init__(self) -> None:
+    def __init__(self, url: str = None, echo: bool = None,
+                 reset: bool = None) -> None:
         """Initialize new DB
+
+        Existing data is kept and the pending migrations are applied.
+        `url`, `echo` and `reset` default to DB_URL, DB_ECHO and
+        DB_RESET.
+        """
+        url = make_url(url or DB_URL)
+        options = {"echo": DB_ECHO if echo is None else echo}
+        sqlite_file = url.get_backend_name() == "sqlite" and \
+            url.database not in (None, "", ":memory:")
+        if url.get_backend_name() != "sqlite" or sqlite_file:
+            options["poolclass"] = QueuePool
+            options["pool_size"] = DB_POOL_SIZE
+            options["max_overflow"] = DB_MAX_OVERFLOW
+            options["pool_pre_ping"] = True
+        if sqlite_file:
+            # Pooled connections move between request threads
+            options["connect_args"] = {"check_same_thread": False}
+        self._engine = create_engine(url, **options)
+        if sqlite_file:
+            event.listen(self._engine, "connect", _set_sqlite_pragmas)
+        if DB_RESET if reset is None else reset:
+            Base.metadata.drop_all(self._engine)
+            with self._engine.begin() as connection:
+                connection.execute(text("DROP TABLE IF EXISTS schema_version"))
+        self.migrate()
+        # One session per thread, removed at the end of each request
+        self._sessions = scoped_session(sessionmaker(bind=self._engine))
+
+    def migrate(self) -> int:
+        """Applies the migrations newer than the schema version.
+
+        Processes starting together are serialized by an exclusive lock
+        taken before the version is read, so each migration runs once:
+        a write transaction on SQLite, an advisory lock on PostgreSQL
+        and MySQL.
+
+        Returns:
+            int: The schema version of the database.
         """
-        self._engine = create_engine("sqlite:///a.db", echo=True)
-        Base.metadata.drop_all(self._engine)
-        Base.metadata.create_all(self._engine)
-        self.__session = None
+        dialect = self._engine.dialect.name
+        with self._engine.connect() as connection:
+            dbapi_connection = connection.connection.connection
+            if dialect == "sqlite":
+                # Let BEGIN IMMEDIATE open the transaction, which pysqlite
+                # would otherwise open itself, deferred, before DML only
+                isolation_level = dbapi_connection.isolation_level
+                dbapi_connection.isolation_level = None
+            try:
+                with connection.begin():
+                    if dialect == "sqlite":
+                        connection.execute(text("BEGIN IMMEDIATE"))
+                    elif dialect == "postgresql":
+                        connection.execute(text(
+                            "SELECT pg_advisory_xact_lock(hashtext("
+                            "'schema_version'))"))
+                    elif dialect == "mysql":
+                        connection.execute(text(
+                            "SELECT GET_LOCK('schema_version', -1)"))
+                    return self._migrate(connection)
+            finally:
+                if dialect == "sqlite":
+                    dbapi_connection.isolation_level = isolation_level
+                elif dialect == "mysql":
+                    connection.execute(text(
+                        "SELECT RELEASE_LOCK('schema_version')"))
+
+    @staticmethod
+    def _migrate(connection) -> int:
+        """Applies the pending migrations, the migration lock being held.
+
+        Returns:
+            int: The schema version of the database.
+        """
+        _create_schema_version(connection)
+        version = connection.execute(text(
+            "SELECT MAX(version) FROM schema_version")).scalar() or 0
+        for number, migration in MIGRATIONS:
+            if number <= version:
+                continue
+            migration(connection)
+            connection.execute(text(
+                "INSERT INTO schema_version (version) VALUES (:version)"),
+                {"version": number})
+            version = number
+        return version
 
     @property
     def _session(self) -> Session:
-        """session object
+        """session object of the current thread
+        """
+        return self._sessions()
+
+    def remove_session(self) -> None:
+        """Closes the session of the current thread, returning its
+        connection to the pool and emptying its identity map.
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        self._sessions.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """Adds new user to db with given email and hash password.
+
+        Raises:
+            error: ValueError: When a user already has this email.
         """
         # Create new user
         new_user = User(email=email, hashed_password=hashed_password)
         try:
             self._session.add(new_user)
             self._session.commit()
-        except Exception as e:
-            print(f"Error adding user to database: {e}")
+        except IntegrityError:
+            self._session.rollback()
+            # Only the unique index on email makes the user a duplicate,
+            # other failures (such as a missing column) are raised as is
+            if email is not None and \
+                    self.find_user_fields(("id",), email=email) is not None:
+                raise ValueError(f"User {email} already exists")
+            raise
+        except Exception:
             self._session.rollback()
             raise
         return new_user
 
+    def add_users_bulk(self, records: Iterable[Tuple[str, object]],
+                       chunk_size: int = None,
+                       hash_passwords: Callable[[List[str]],
+                                                Iterable[bytes]] = None
+                       ) -> Tuple[int, List[Tuple[int, str, str]]]:
+        """Adds users from (email, hashed password) records, with one
+        transaction and one executemany per chunk of records.
+
+        Records without email or password, or whose email is taken by a
+        user or an earlier record, are skipped and reported. With
+        `hash_passwords`, str passwords are hashed by it, a chunk at a
+        time, once the records to skip are known.
+
+        Returns:
+            Tuple[int, List[Tuple[int, str, str]]]: The number of users
+            added, and the position in `records`, email and reason
+            ("invalid", "duplicate" or "exists") of each skipped record.
+        """
+        chunk_size = chunk_size or DB_BULK_CHUNK
+        records = enumerate(records)
+        added, conflicts = 0, []
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                return added, conflicts
+            added += self._add_users_chunk(chunk, conflicts, hash_passwords)
+
+    def _add_users_chunk(self, chunk: List[Tuple[int, Tuple[str, object]]],
+                         conflicts: List[Tuple[int, str, str]],
+                         hash_passwords: Callable[[List[str]],
+                                                  Iterable[bytes]] = None
+                         ) -> int:
+        """Adds one chunk of add_users_bulk, reporting its skipped records
+        in `conflicts`.
+
+        Returns:
+            int: The number of users added.
+        """
+        table = User.__table__
+        rows, emails = [], set()
+        for position, (email, hashed_password) in chunk:
+            if not email or not hashed_password:
+                conflicts.append((position, email, "invalid"))
+            elif email in emails:
+                conflicts.append((position, email, "duplicate"))
+            else:
+                emails.add(email)
+                rows.append((position, email, hashed_password))
+        if hash_passwords is not None and rows:
+            # Skip the emails already taken before spending time hashing
+            with self._engine.connect() as connection:
+                taken = {row[0] for row in connection.execute(
+                    select([table.c.email]).where(table.c.email.in_(emails)))}
+            conflicts.extend((position, email, "exists")
+                             for position, email, _ in rows if email in taken)
+            rows = [row for row in rows if row[1] not in taken]
+            emails -= taken
+            hashes = iter(hash_passwords([password for _, _, password in rows
+                                          if isinstance(password, str)]))
+            rows = [(position, email,
+                     next(hashes) if isinstance(password, str) else password)
+                    for position, email, password in rows]
+        if not rows:
+            return 0
+        try:
+            with self._engine.begin() as connection:
+                taken = {row[0] for row in connection.execute(
+                    select([table.c.email]).where(table.c.email.in_(emails)))}
+                new_rows = [{"email": email, "hashed_password": hashed}
+                            for _, email, hashed in rows if email not in taken]
+                if new_rows:
+                    connection.execute(table.insert(), new_rows)
+        except IntegrityError:
+            # An email was taken since the check: add the rows one by one
+            added = 0
+            for position, email, hashed_password in rows:
+                try:
+                    with self._engine.begin() as connection:
+                        connection.execute(table.insert(), {
+                            "email": email,
+                            "hashed_password": hashed_password,
+                        })
+                    added += 1
+                except IntegrityError:
+                    conflicts.append((position, email, "exists"))
+            return added
+        conflicts.extend((position, email, "exists")
+                         for position, email, _ in rows if email in taken)
+        return len(new_rows)
+
+    def iter_users(self, chunk_size: int = None
+                   ) -> Iterator[Tuple[str, bytes]]:
+        """Streams the (email, hashed password) of every user, in the
+        record format of add_users_bulk.
+
+        Users are read by chunks in id order, each chunk in its own short
+        query, so the export holds no long transaction.
+        """
+        chunk_size = chunk_size or DB_BULK_CHUNK
+        table = User.__table__
+        query = select([table.c.id, table.c.email, table.c.hashed_password])
+        last_id = None
+        while True:
+            page = query
+            if last_id is not None:
+                page = page.where(table.c.id > last_id)
+            with self._engine.connect() as connection:
+                rows = connection.execute(
+                    page.order_by(table.c.id).limit(chunk_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[1], row[2]
+            last_id = rows[-1][0]
+
     def find_user_by(self, **kwargs: Dict[str, str]) -> User:
         """Find user by specified attributes.
 
@@ -71,6 +358,41 @@ class DB:
         # print("Type of user: {}".format(type(user)))
         return user
 
+    def find_user_fields(self, fields: Tuple[str, ...],
+                         **kwargs: Dict[str, str]) -> Tuple:
+        """Find the given columns of the first user matching attributes,
+        in one query that doesn't go through the ORM session.
+
+        Raises:
+            error: InvalidRequestError: When a column is unknown.
+
+        Returns:
+            Tuple: The values of `fields`, None if no user matches.
+        """
+        table = User.__table__
+        for name in tuple(fields) + tuple(kwargs):
+            if name not in table.c:
+                raise InvalidRequestError()
+        query = select([table.c[name] for name in fields])
+        for name, value in kwargs.items():
+            query = query.where(table.c[name] == value)
+        with self._engine.connect() as connection:
+            row = connection.execute(query.limit(1)).first()
+        return tuple(row) if row is not None else None
+
+    def clear_session(self, session_id: str) -> bool:
+        """Removes a session id from its user, in one statement.
+
+        Returns:
+            bool: True if a user had this session id, False otherwise.
+        """
+        table = User.__table__
+        with self._engine.begin() as connection:
+            result = connection.execute(
+                table.update().where(table.c.session_id == session_id)
+                .values(session_id=None))
+        return result.rowcount > 0
+
     def update_user(self, user_id: int, **kwargs) -> None:
         """Updates user's attributes user ID and arbitrary keyword
         arguments.
@@ -3,7 +3,7 @@
 """
 
 
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Index, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -13,6 +13,13 @@ class User(Base):
     """Class representing a user in system.
     """
     __tablename__ = 'users'
+    # Each column is looked up by DB.find_user_by, and holds unique
+    # values: emails, and the uuids of sessions and reset tokens
+    __table_args__ = (
+        Index('ix_users_email', 'email', unique=True),
+        Index('ix_users_session_id', 'session_id', unique=True),
+        Index('ix_users_reset_token', 'reset_token', unique=True),
+    )
     id = Column(Integer, primary_key=True)
     email = Column(String(250), nullable=False)
     hashed_password = Column(String(250), nullable=False)